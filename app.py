@@ -1,38 +1,131 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, Response, stream_with_context, make_response
+from flask.cli import AppGroup
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from flask_mail import Mail, Message
-from pymongo import MongoClient
+from flask_mail import Mail, Message, BadHeaderError
+from pymongo import MongoClient, IndexModel, ReturnDocument, UpdateOne, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import PyMongoError, DuplicateKeyError
 from datetime import datetime, timezone, timedelta
 from bson import ObjectId
 from slugify import slugify
 import re
 import jwt
-from werkzeug.utils import secure_filename
 from functools import wraps
+from markupsafe import Markup, escape
 import secrets
+import socket
+import multiprocessing
+import smtplib
+import base64
+import hashlib
+import json
+import tempfile
+import queue
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import click
 import google.generativeai as genai
 
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Uploads are stored as <aa>/<bb>/<sha256>.<ext>, so a URL always points at the same bytes
+UPLOAD_NAME_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(-thumb|-card)?\.[a-z0-9]+$')
+UPLOAD_URL_PATTERN = re.compile(r'/static/uploads/([0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+)')
+UPLOAD_READ_CHUNK_BYTES = 64 * 1024
+UPLOAD_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+# Bump when parse_content_for_display output changes so stored renders are refreshed
+RENDERER_VERSION = 3
+EXCERPT_LENGTH = 150
+
+# Feed pagination
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+TAG_CLOUD_SIZE = 30
+
+# Search: results past MAX_SEARCH_RESULTS are not reachable by paging, since each page
+# costs a sort of every match before it
+MAX_SEARCH_RESULTS = 1000
+MAX_SEARCH_QUERY_LENGTH = 200
+SEARCH_SNIPPET_LENGTH = 240
+SEARCH_STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+                     'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with'}
+
+# Field projections, so read paths only pull what they use from MongoDB
+INDEX_FIELDS = ['title', 'slug', 'excerpt', 'hero_banner_url', 'hero_banner_variants', 'timestamp', 'last_updated', 'tags', 'renderer_version']
+VIEW_FIELDS = INDEX_FIELDS + ['content', 'parsed_content', 'author_id', 'author_username']
+# Just enough of a post to tell whether a response built from it has changed
+VERSION_FIELDS = ['last_updated', 'renderer_version', 'hero_banner_variants.width']
+EDIT_FIELDS = ['title', 'slug', 'content', 'tags', 'hero_banner_url', 'author_id', 'upload_refs']
+# Fields the JSON API exposes; clients may narrow them with ?fields=
+API_POST_FIELDS = ['_id', 'title', 'slug', 'content', 'parsed_content', 'excerpt', 'author_id', 'author_username',
+                   'timestamp', 'last_updated', 'tags', 'hero_banner_url', 'hero_banner_variants']
 
 load_dotenv()
 
 # Configure Gemini AI
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+# Bump when the summary prompts in generate_ai_summary change so stored summaries are regenerated
+SUMMARY_PROMPT_VERSION = 1
 if GEMINI_API_KEY and GEMINI_API_KEY != 'your-gemini-api-key-here':
     genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
 else:
     gemini_model = None
     print("Warning: GEMINI_API_KEY not configured. AI summaries will be disabled.")
 
+# Pillow is needed to resize uploads and strip their metadata; without it images are served as uploaded
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:
+    Image = None
+    print("Warning: Pillow not installed. Uploaded images will not be resized.")
+
+# redis is only needed when PAGE_CACHE_BACKEND=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-this')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-this')
+# Opt-in: read-only endpoints marked stateless trust signed token claims instead of loading the user
+app.config['JWT_STATELESS_AUTH'] = os.getenv('JWT_STATELESS_AUTH', 'False').lower() == 'true'
+# Access tokens default to 15 minutes in stateless mode, 7 days otherwise
+app.config['JWT_ACCESS_TOKEN_MINUTES'] = int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15 if app.config['JWT_STATELESS_AUTH'] else 7 * 24 * 60))
+app.config['JWT_REFRESH_TOKEN_DAYS'] = int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 30))
+app.config['JWT_REVOCATION_SYNC_SECONDS'] = int(os.getenv('JWT_REVOCATION_SYNC_SECONDS', 30))
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# How long an upload no post references is kept, so one added in the editor survives until the post is saved
+app.config['UPLOAD_ORPHAN_SECONDS'] = int(os.getenv('UPLOAD_ORPHAN_SECONDS', 24 * 60 * 60))
+app.config['RENDER_CACHE_MAX_BYTES'] = int(os.getenv('RENDER_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+app.config['ENSURE_INDEXES_ON_STARTUP'] = os.getenv('ENSURE_INDEXES_ON_STARTUP', 'True').lower() == 'true'
+# Full-page cache for anonymous readers: memory (per process), redis (shared) or none
+app.config['PAGE_CACHE_BACKEND'] = os.getenv('PAGE_CACHE_BACKEND', 'memory').lower()
+app.config['PAGE_CACHE_REDIS_URL'] = os.getenv('PAGE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', 60))
+app.config['PAGE_CACHE_STALE_SECONDS'] = int(os.getenv('PAGE_CACHE_STALE_SECONDS', 300))
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.getenv('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Bearer token monitoring must send to read /api/metrics; the endpoint is off while unset
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+app.config['JOB_LEASE_SECONDS'] = int(os.getenv('JOB_LEASE_SECONDS', 60))
+app.config['SUMMARY_MAX_ATTEMPTS'] = int(os.getenv('SUMMARY_MAX_ATTEMPTS', 5))
+app.config['SUMMARY_RETRY_BASE_SECONDS'] = int(os.getenv('SUMMARY_RETRY_BASE_SECONDS', 30))
+# How long a summary that failed every attempt stays failed before a reader's request queues it again
+app.config['SUMMARY_RERUN_COOLDOWN_SECONDS'] = int(os.getenv('SUMMARY_RERUN_COOLDOWN_SECONDS', 600))
+app.config['SUMMARY_RATE_LIMIT_PER_MINUTE'] = int(os.getenv('SUMMARY_RATE_LIMIT_PER_MINUTE', 15))
+app.config['SUMMARY_CHUNK_TOKENS'] = int(os.getenv('SUMMARY_CHUNK_TOKENS', 4000))
+app.config['SUMMARY_CHUNK_WORKERS'] = int(os.getenv('SUMMARY_CHUNK_WORKERS', 4))
 
 # Mail configuration
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -40,6 +133,14 @@ app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
 app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+app.config['EMAIL_RETRY_BASE_SECONDS'] = int(os.getenv('EMAIL_RETRY_BASE_SECONDS', 30))
+app.config['EMAIL_SMTP_MAX_IDLE_SECONDS'] = int(os.getenv('EMAIL_SMTP_MAX_IDLE_SECONDS', 60))
+
+# Password hashing: bcrypt cost factor and the bounded pool that runs it
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+app.config['PASSWORD_HASH_QUEUE_DEPTH'] = int(os.getenv('PASSWORD_HASH_QUEUE_DEPTH', 16))
 
 # Initialize extensions
 login_manager = LoginManager()
@@ -61,6 +162,562 @@ db = client['duffins_blog']
 posts_collection = db['posts']
 users_collection = db['users']
 reset_tokens_collection = db['reset_tokens']
+slug_counters_collection = db['slug_counters']
+revoked_tokens_collection = db['revoked_tokens']
+refresh_tokens_collection = db['refresh_tokens']
+jobs_collection = db['jobs']
+checkpoints_collection = db['checkpoints']
+summary_chunks_collection = db['summary_chunks']
+uploads_collection = db['uploads']
+tag_counts_collection = db['tag_counts']
+
+# Indexes the queries above rely on, by collection name
+INDEX_SPECS = {
+    'posts': [
+        IndexModel([('slug', ASCENDING)], name='slug_unique', unique=True),
+        IndexModel([('timestamp', DESCENDING), ('_id', DESCENDING)], name='timestamp_id'),
+        # Multikey: one entry per tag, so a tag's feed is read in order like the main one
+        IndexModel([('tags', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='tags_timestamp_id'),
+        IndexModel([('author_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)], name='author_id_timestamp_id'),
+        # A match in the title counts ten times one in the body
+        IndexModel([('title', TEXT), ('tags', TEXT), ('content', TEXT)], name='text_search',
+                   weights={'title': 10, 'tags': 5, 'content': 1}, default_language='english')
+    ],
+    'users': [
+        IndexModel([('username', ASCENDING)], name='username_unique', unique=True),
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True)
+    ],
+    'reset_tokens': [
+        IndexModel([('token', ASCENDING)], name='token'),
+        # Expired reset tokens are removed by MongoDB as soon as expires_at passes
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+    ],
+    'revoked_tokens': [
+        # A revocation is only needed until the tokens it covers have expired
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+    ],
+    'refresh_tokens': [
+        IndexModel([('user_id', ASCENDING)], name='user_id'),
+        # A session nobody refreshed within the refresh token lifetime is over
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0)
+    ],
+    'jobs': [
+        IndexModel([('status', ASCENDING), ('priority', DESCENDING), ('run_after', ASCENDING)], name='status_priority_run_after'),
+        IndexModel([('status', ASCENDING), ('lease_expires_at', ASCENDING)], name='status_lease_expires_at'),
+        # Finished jobs are kept for a week so repeated requests for the same summary stay no-ops
+        IndexModel([('finished_at', ASCENDING)], name='finished_at_ttl', expireAfterSeconds=7 * 24 * 60 * 60)
+    ],
+    'tag_counts': [
+        IndexModel([('count', DESCENDING), ('_id', ASCENDING)], name='count_id')
+    ],
+    'summary_chunks': [
+        # Section summaries nobody has needed for six months are dropped
+        IndexModel([('last_used_at', ASCENDING)], name='last_used_at_ttl', expireAfterSeconds=180 * 24 * 60 * 60)
+    ]
+}
+
+def _index_key(key):
+    key = [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in key]
+    # MongoDB lists a text index under _fts/_ftsx, whichever fields it covers
+    if any(direction == TEXT for _, direction in key):
+        key = [(field, direction) for field, direction in key if direction != TEXT and field not in ('_fts', '_ftsx')]
+        key += [('_fts', TEXT), ('_ftsx', 1)]
+    return key
+
+def check_indexes():
+    """Compare live indexes with INDEX_SPECS.
+
+    Returns {collection: {'missing': [...], 'redundant': [...], 'unmanaged': [...]}} where
+    redundant indexes are a strict prefix of another index on the same collection.
+    """
+    report = {}
+    for collection_name, models in INDEX_SPECS.items():
+        existing = {name: info for name, info in db[collection_name].index_information().items() if name != '_id_'}
+        existing_keys = [_index_key(info['key']) for info in existing.values()]
+        expected_keys = [_index_key(model.document['key'].items()) for model in models]
+
+        missing = [model.document['name'] for model, key in zip(models, expected_keys) if key not in existing_keys]
+        redundant = []
+        unmanaged = []
+        for name, info in existing.items():
+            key = _index_key(info['key'])
+            if key not in expected_keys:
+                unmanaged.append(name)
+            covered = any(other != key and other[:len(key)] == key for other in existing_keys)
+            if covered and not info.get('unique') and 'expireAfterSeconds' not in info:
+                redundant.append(name)
+        report[collection_name] = {'missing': missing, 'redundant': redundant, 'unmanaged': unmanaged}
+    return report
+
+def ensure_indexes():
+    """Create any missing indexes from INDEX_SPECS and print what was found; safe to run repeatedly"""
+    report = check_indexes()
+    for collection_name, models in INDEX_SPECS.items():
+        result = report[collection_name]
+        for model in models:
+            if model.document['name'] not in result['missing']:
+                continue
+            try:
+                db[collection_name].create_indexes([model])
+                print(f"Created index {collection_name}.{model.document['name']}")
+            except PyMongoError as e:
+                # e.g. duplicate slugs or usernames already in the collection
+                print(f"Error creating index {collection_name}.{model.document['name']}: {e}")
+        for name in result['redundant']:
+            print(f"Warning: index {collection_name}.{name} is redundant (prefix of another index)")
+        for name in result['unmanaged']:
+            print(f"Note: index {collection_name}.{name} is not managed by the app")
+    return report
+
+@app.cli.command('ensure-indexes')
+@click.option('--check', is_flag=True, help='Only report missing and redundant indexes.')
+def ensure_indexes_command(check):
+    """Create the MongoDB indexes the app needs"""
+    if check:
+        for collection_name, result in check_indexes().items():
+            for kind in ('missing', 'redundant', 'unmanaged'):
+                for name in result[kind]:
+                    print(f"{collection_name}.{name}: {kind}")
+    else:
+        ensure_indexes()
+
+if app.config['ENSURE_INDEXES_ON_STARTUP']:
+    try:
+        ensure_indexes()
+    except PyMongoError as e:
+        print(f"Warning: could not verify MongoDB indexes at startup: {e}")
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after ttl seconds, bounded by entry count"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'entries': len(self._entries),
+                'ttl': self.ttl
+            }
+
+# User documents by id, so Flask-Login and JWT auth don't query MongoDB on every request.
+# Each worker process has its own copy; the TTL bounds how long another worker can serve stale data.
+user_cache = TTLCache(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_MAX_ENTRIES'])
+
+class Histogram:
+    """Thread-safe cumulative histogram of durations in seconds"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip([str(bound) for bound in self.buckets] + ['+Inf'], counts):
+            running += count
+            cumulative[bound] = running
+        return {'buckets': cumulative, 'count': running, 'sum': round(total, 6)}
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key wait and share its result"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            self.waiters = 0
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.wait_seconds = Histogram()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+        if not leader:
+            started = time.monotonic()
+            call.done.wait()
+            self.wait_seconds.observe(time.monotonic() - started)
+            if call.error:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+            waiting = sum(call.waiters for call in self._calls.values())
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': in_flight,
+            'waiting': waiting,
+            'wait_seconds': self.wait_seconds.snapshot()
+        }
+
+class HashPoolBusy(Exception):
+    """Raised when the password hashing queue is full; callers should answer 429"""
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so a login burst can't starve every request thread.
+
+    bcrypt releases the GIL while hashing, so worker threads give real parallelism.
+    At most workers + queue_depth calls are admitted; the rest fail fast with HashPoolBusy.
+    """
+
+    def __init__(self, bcrypt, workers, queue_depth):
+        self.bcrypt = bcrypt
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self.queue_wait = Histogram()
+        self.hash_time = Histogram()
+        self.rejected = 0
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+        submitted = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            self.queue_wait.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                self.hash_time.observe(time.monotonic() - started)
+                self._slots.release()
+
+        return self._executor.submit(task).result()
+
+    def generate_password_hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def check_password_hash(self, password_hash, password):
+        return self._run(self.bcrypt.check_password_hash, password_hash, password)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue_depth,
+            'rounds': app.config['BCRYPT_LOG_ROUNDS'],
+            'rejected': self.rejected,
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+            'hash_seconds': self.hash_time.snapshot()
+        }
+
+password_hasher = PasswordHasher(bcrypt, app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE_DEPTH'])
+
+# Background jobs: slow side effects are queued in the jobs collection and run by worker threads in
+# the web process (JOB_WORKERS) or in `flask jobs worker`. Delivery is at least once: a job whose
+# lease runs out is run again, so handlers must be safe to repeat.
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying cannot help"""
+    pass
+
+class JobRunner:
+    """Durable jobs in one MongoDB collection, claimed atomically and held under a renewable lease"""
+
+    STATUSES = ('pending', 'running', 'done', 'failed', 'superseded')
+    POLL_SECONDS = 5
+
+    def __init__(self, collection, workers, lease_seconds):
+        self.collection = collection
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.types = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        # Lease tokens of the jobs this process is running, renewed by the heartbeat thread
+        self._leases = {}
+        self._counts = (0, None)
+
+    def register(self, job_type, handler, max_attempts=5, retry_base_seconds=30, max_retry_seconds=3600, priority=0):
+        """Run handler(job) for jobs of job_type; it may return a final status other than 'done'"""
+        self.types[job_type] = SimpleNamespace(
+            handler=handler,
+            max_attempts=max_attempts,
+            retry_base_seconds=retry_base_seconds,
+            max_retry_seconds=max_retry_seconds,
+            priority=priority
+        )
+
+    def enqueue(self, job_type, payload, job_id=None, priority=None, delay=0):
+        """Queue a job and return it; queueing an existing job_id again returns that job instead"""
+        now = datetime.now(timezone.utc)
+        if priority is None:
+            priority = self.types[job_type].priority
+        fields = {
+            'type': job_type,
+            'payload': payload,
+            'status': 'pending',
+            'attempts': 0,
+            'run_after': now + timedelta(seconds=delay),
+            'created_at': now,
+            'updated_at': now
+        }
+        if job_id is None:
+            job = dict(fields, priority=priority)
+            job['_id'] = self.collection.insert_one(job).inserted_id
+        else:
+            # A repeated request can still raise the priority of the queued job
+            job = self.collection.find_one_and_update(
+                {'_id': job_id},
+                {'$setOnInsert': fields, '$max': {'priority': priority}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        if job['status'] == 'pending':
+            self.notify()
+        return job
+
+    def retry(self, job_id, statuses=('failed',), finished_before=None):
+        """Queue a failed job (or one in another finished status) again with a fresh set of attempts
+
+        With finished_before, only a job that finished before that time is queued again.
+        """
+        now = datetime.now(timezone.utc)
+        query = {'_id': job_id, 'status': {'$in': list(statuses)}}
+        if finished_before is not None:
+            query['finished_at'] = {'$lte': finished_before}
+        self.collection.update_one(query, {
+            '$set': {'status': 'pending', 'attempts': 0, 'run_after': now, 'updated_at': now},
+            '$unset': {'finished_at': ''}
+        })
+
+    def get(self, job_id):
+        return self.collection.find_one({'_id': job_id})
+
+    def notify(self):
+        """Wake the workers for a newly queued job"""
+        self.start()
+        self._wakeup.set()
+
+    def claim(self, types=None):
+        """Atomically take the most urgent due job, including running jobs whose lease has run out"""
+        now = datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            {
+                'type': {'$in': list(types or self.types)},
+                '$or': [
+                    {'status': 'pending', 'run_after': {'$lte': now}},
+                    {'status': 'running', 'lease_expires_at': {'$lt': now}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': 'running',
+                    'lease_token': secrets.token_hex(8),
+                    'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                    'worker': self.worker_id,
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('priority', DESCENDING), ('run_after', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _settle(self, job, update):
+        # Only the lease holder may record the outcome; a worker that lost its lease leaves the job alone
+        result = self.collection.update_one(
+            {'_id': job['_id'], 'lease_token': job['lease_token']},
+            {'$set': dict(update, updated_at=datetime.now(timezone.utc)), '$unset': {'lease_token': '', 'lease_expires_at': ''}}
+        )
+        if not result.modified_count:
+            print(f"Lost the lease on {job['type']} job {job['_id']}; another worker took it over")
+
+    def _finish(self, job, status, error=None):
+        update = {'status': status, 'finished_at': datetime.now(timezone.utc)}
+        if error:
+            update['last_error'] = error
+        self._settle(job, update)
+
+    def _fail(self, job, error):
+        """Retry with exponential backoff, or give up after the type's max_attempts"""
+        policy = self.types[job['type']]
+        if job['attempts'] >= policy.max_attempts:
+            self._finish(job, 'failed', error)
+            return
+        delay = min(policy.max_retry_seconds, policy.retry_base_seconds * 2 ** (job['attempts'] - 1))
+        self._settle(job, {
+            'status': 'pending',
+            'run_after': datetime.now(timezone.utc) + timedelta(seconds=delay),
+            'last_error': error
+        })
+
+    def run(self, job):
+        with self._lock:
+            self._leases[job['_id']] = job['lease_token']
+        try:
+            with app.app_context():
+                status = self.types[job['type']].handler(job)
+            self._finish(job, status or 'done')
+        except PermanentJobError as e:
+            self._finish(job, 'failed', str(e))
+        except Exception as e:
+            print(f"Error running {job['type']} job {job['_id']}: {e}")
+            self._fail(job, str(e))
+        finally:
+            with self._lock:
+                self._leases.pop(job['_id'], None)
+
+    def run_once(self, types=None):
+        """Claim and run a single due job; returns False when there was nothing to do"""
+        job = self.claim(types)
+        if not job:
+            return False
+        self.run(job)
+        return True
+
+    def run_pending(self, types=None):
+        """Run due jobs on the calling thread until none are left; returns how many ran"""
+        count = 0
+        while self.run_once(types):
+            count += 1
+        return count
+
+    def renew_leases(self):
+        with self._lock:
+            leases = list(self._leases.items())
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        for job_id, token in leases:
+            try:
+                self.collection.update_one({'_id': job_id, 'lease_token': token}, {'$set': {'lease_expires_at': expires_at}})
+            except PyMongoError as e:
+                print(f"Error renewing lease on job {job_id}: {e}")
+
+    def _heartbeat(self):
+        while not self._stopping.wait(self.lease_seconds / 3):
+            self.renew_leases()
+
+    def _work(self, types, burst):
+        while not self._stopping.is_set():
+            try:
+                busy = self.run_once(types)
+            except PyMongoError as e:
+                print(f"Error claiming job: {e}")
+                busy = False
+            if not busy:
+                if burst:
+                    return
+                self._wakeup.wait(self.POLL_SECONDS)
+                self._wakeup.clear()
+
+    def start(self, workers=None, types=None, burst=False):
+        """Start worker threads and the lease heartbeat; called lazily so each forked server process starts its own"""
+        workers = self.workers if workers is None else workers
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads, self._pid = [], os.getpid()
+                self.worker_id = f"{socket.gethostname()}:{self._pid}"
+            if self._threads or workers <= 0:
+                return
+            self._stopping.clear()
+            for i in range(workers):
+                thread = threading.Thread(target=self._work, args=(types, burst), name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def join(self):
+        """Wait for the worker threads to exit, waking up regularly so Ctrl-C is handled"""
+        for thread in list(self._threads):
+            while thread.is_alive():
+                thread.join(1)
+
+    def stop(self, timeout=None):
+        """Let running jobs finish, then stop the workers and the heartbeat"""
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.lease_seconds)
+        for thread in list(self._threads):
+            thread.join(max(0, deadline - time.monotonic()))
+        with self._lock:
+            self._threads = []
+
+    def stats(self, max_age=0):
+        """Job counts by type and status, reusing counts taken in the last max_age seconds"""
+        counted_at, counts = self._counts
+        if counts is None or time.monotonic() - counted_at > max_age:
+            counts = {}
+            for row in self.collection.aggregate([{'$group': {'_id': {'type': '$type', 'status': '$status'}, 'count': {'$sum': 1}}}]):
+                counts.setdefault(row['_id']['type'], dict.fromkeys(self.STATUSES, 0))[row['_id']['status']] = row['count']
+            self._counts = (time.monotonic(), counts)
+        with self._lock:
+            running_here = len(self._leases)
+        return {'types': counts, 'workers': len(self._threads), 'running_here': running_here}
+
+job_runner = JobRunner(jobs_collection, app.config['JOB_WORKERS'], app.config['JOB_LEASE_SECONDS'])
 
 # User class for Flask-Login
 class User(UserMixin):
@@ -77,10 +734,18 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
-        user_data = users_collection.find_one({"_id": ObjectId(user_id)})
-        if user_data:
-            return User(user_data)
-        return None
+        user_data = user_cache.get(str(user_id))
+        if user_data is None:
+            user_data = users_collection.find_one({"_id": ObjectId(user_id)})
+            if not user_data:
+                return None
+            user_cache.put(str(user_id), user_data)
+        return User(user_data)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a cached user after its document changes"""
+        user_cache.invalidate(str(user_id))
 
     @staticmethod
     def get_by_username(username):
@@ -101,20 +766,16 @@ def load_user(user_id):
     return User.get(user_id)
 
 # AI Summary Generation Function
-def generate_ai_summary(content, title=""):
-    """Generate an AI summary of the blog post content using Gemini AI"""
-    if not gemini_model:
+def build_summary_prompt(content, title=""):
+    """The Gemini prompt for a post, or None if the content is too short to summarize"""
+    # Clean the content and prepare prompt
+    clean_content = content.replace('\n', ' ').strip()
+    if len(clean_content) < 5:  # Too short to summarize
         return None
-    
-    try:
-        # Clean the content and prepare prompt
-        clean_content = content.replace('\n', ' ').strip()
-        if len(clean_content) < 5:  # Too short to summarize
-            return None
-            
-        # Adjust prompt based on content length
-        if len(clean_content) < 50:
-            prompt = f"""
+        
+    # Adjust prompt based on content length
+    if len(clean_content) < 50:
+        return f"""
             This is a very short blog post. Please provide a brief, thoughtful summary or interpretation in 1-2 sentences.
             Even if the content is minimal, try to provide some context or insight.
             
@@ -123,8 +784,7 @@ def generate_ai_summary(content, title=""):
             
             Summary:
             """
-        else:
-            prompt = f"""
+    return f"""
             Please provide a concise and engaging summary of this blog post in 2-3 sentences. 
             Focus on the main points and key takeaways. The summary should be informative yet accessible.
             
@@ -133,7 +793,170 @@ def generate_ai_summary(content, title=""):
             
             Summary:
             """
+
+def summary_model_name():
+    """The model name stored summaries are keyed by; the offline stub has its own so its output is never served as Gemini's"""
+    return getattr(gemini_model, 'summary_model_name', GEMINI_MODEL_NAME)
+
+# Long posts are summarized section by section (map), then from the section summaries (reduce)
+def estimate_tokens(text):
+    """Rough token count for Gemini models, about four characters per token"""
+    return len(text) // 4 + 1
+
+def _split_paragraph(paragraph, budget):
+    """Split a paragraph longer than the budget at whitespace, and any longer run without spaces (CJK text, URLs) where it hits the budget"""
+    width = max(1, (budget - 1) * 4)
+    pieces, current = [], ''
+    for word in paragraph.split(' '):
+        if estimate_tokens(word) > budget:
+            if current:
+                pieces.append(current)
+            parts = [word[i:i + width] for i in range(0, len(word), width)]
+            pieces.extend(parts[:-1])
+            current = parts[-1]
+            continue
+        if current and estimate_tokens(current + ' ' + word) > budget:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_into_chunks(content, budget):
+    """Split content at paragraph boundaries into chunks of at most `budget` tokens
+
+    Besides the budget, a chunk also ends before a heading or before a paragraph whose hash
+    picks it as a cut point, so boundaries depend on nearby text only and an edit to one
+    section leaves the other chunks (and their cached summaries) unchanged.
+    """
+    paragraphs = []
+    for paragraph in re.split(r'\n\s*\n', content.replace('\r\n', '\n')):
+        paragraph = paragraph.strip()
+        if paragraph:
+            paragraphs.extend(_split_paragraph(paragraph, budget) if estimate_tokens(paragraph) > budget else [paragraph])
+
+    chunks, current = [], []
+    for paragraph in paragraphs:
+        size = estimate_tokens('\n\n'.join(current))
+        if current and (
+            estimate_tokens('\n\n'.join(current + [paragraph])) > budget
+            or (paragraph.startswith('#') and size >= budget // 4)
+            or (size >= budget // 2 and hashlib.sha256(paragraph.encode('utf-8')).digest()[0] % 4 == 0)
+        ):
+            chunks.append('\n\n'.join(current))
+            current = []
+        current.append(paragraph)
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+def _chunk_key(kind, text):
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"{summary_model_name()}:{SUMMARY_PROMPT_VERSION}:{kind}:{digest}"
+
+def _summarize_chunk(prompt, limiter=None):
+    if limiter:
+        limiter.acquire()
+    response = gemini_model.generate_content(prompt)
+    if not response or not response.text:
+        raise ValueError('No summary returned for a section')
+    return response.text.strip()
+
+def summarize_chunks(chunks, kind, prompt_template, limiter=None):
+    """Summaries of each chunk, in order, reusing the ones stored in summary_chunks
+
+    With a limiter (the backfill's), every model call waits for it and the chunks are
+    summarized one at a time, so the caller's concurrency is the number of calls in flight.
+    """
+    keys = [_chunk_key(kind, chunk) for chunk in chunks]
+    now = datetime.now(timezone.utc)
+    stored = {doc['_id']: doc['summary'] for doc in summary_chunks_collection.find({'_id': {'$in': keys}}, {'summary': 1})}
+    if stored:
+        summary_chunks_collection.update_many({'_id': {'$in': list(stored)}}, {'$set': {'last_used_at': now}})
+
+    missing = [(key, chunk) for key, chunk in zip(keys, chunks) if key not in stored]
+    if missing:
+        # Sections shared with another post or another request are only summarized once
+        def summarize(item):
+            key, chunk = item
+            return summary_queue.generations.do(key, _summarize_chunk, prompt_template.format(content=chunk), limiter)
+        # Each section is stored as soon as it is summarized, so when one fails a retry of the
+        # job only redoes the sections that did not finish
+        error = None
+        with ThreadPoolExecutor(max_workers=1 if limiter else app.config['SUMMARY_CHUNK_WORKERS']) as executor:
+            futures = {executor.submit(summarize, item): item[0] for item in missing}
+            for future in as_completed(futures):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                key = futures[future]
+                summary_chunks_collection.update_one(
+                    {'_id': key}, {'$set': {'summary': summary, 'last_used_at': now}}, upsert=True
+                )
+                stored[key] = summary
+        if error:
+            raise error
+    return [stored[key] for key in keys]
+
+SECTION_PROMPT = """
+            This is one section of a longer blog post. Summarize its main points in 2-4 sentences.
+            
+            Content: {content}
+            
+            Summary:
+            """
+
+SECTION_SUMMARIES_PROMPT = """
+            These are summaries of consecutive sections of a longer blog post. Combine them into one summary in 3-5 sentences.
+            
+            Content: {content}
+            
+            Summary:
+            """
+
+def build_long_summary_prompt(content, title="", limiter=None):
+    """Summarize each chunk of a long post and return the prompt that combines them"""
+    budget = app.config['SUMMARY_CHUNK_TOKENS']
+    partials = summarize_chunks(split_into_chunks(content, budget), 'section', SECTION_PROMPT, limiter)
+    # Posts long enough that even the section summaries overflow are reduced in rounds
+    while len(partials) > 1 and estimate_tokens('\n\n'.join(partials)) > budget:
+        chunks = split_into_chunks('\n\n'.join(partials), budget)
+        if len(chunks) >= len(partials):
+            break
+        partials = summarize_chunks(chunks, 'sections', SECTION_SUMMARIES_PROMPT, limiter)
+    combined = '\n\n'.join(partials)
+    return f"""
+            Below are summaries of each section of a long blog post, in order. Please provide a concise and engaging summary of the whole post in 2-3 sentences.
+            Focus on the main points and key takeaways. The summary should be informative yet accessible.
+            
+            Title: {title}
+            Content: {combined}
+            
+            Summary:
+            """
+
+def summary_prompt(content, title="", limiter=None):
+    """The prompt for a post's summary, summarizing long posts chunk by chunk first"""
+    if estimate_tokens(content) > app.config['SUMMARY_CHUNK_TOKENS']:
+        return build_long_summary_prompt(content, title, limiter)
+    return build_summary_prompt(content, title)
+
+def generate_ai_summary(content, title="", limiter=None):
+    """Generate an AI summary of the blog post content using Gemini AI; each model call waits for the limiter if given"""
+    if not gemini_model:
+        return None
+    
+    try:
+        prompt = summary_prompt(content, title, limiter)
+        if not prompt:
+            return None
         
+        if limiter:
+            limiter.acquire()
         response = gemini_model.generate_content(prompt)
         if response and response.text:
             return response.text.strip()
@@ -143,8 +966,568 @@ def generate_ai_summary(content, title=""):
     
     return None
 
+def stream_ai_summary(content, title="", on_text=None):
+    """Like generate_ai_summary, but uses Gemini's streaming mode and passes each piece of text to on_text"""
+    if not gemini_model:
+        return None
+    
+    try:
+        prompt = summary_prompt(content, title)
+        if not prompt:
+            return None
+        
+        parts = []
+        for chunk in gemini_model.generate_content(prompt, stream=True):
+            if chunk.text:
+                parts.append(chunk.text)
+                if on_text:
+                    on_text(chunk.text)
+        return ''.join(parts).strip() or None
+    except Exception as e:
+        print(f"Error streaming AI summary: {e}")
+        return None
+
+# Stored AI summaries: the post keeps its last summary together with the key it was generated for
+def summary_cache_key(title, content, model_name=None):
+    """Identifies a summary by model, prompt version and a hash of the title and content"""
+    digest = hashlib.sha256(f"{title}\0{content}".encode('utf-8')).hexdigest()
+    return f"{model_name or summary_model_name()}:{SUMMARY_PROMPT_VERSION}:{digest}"
+
+def get_stored_summary(post):
+    """The post's stored summary if it still matches its title and content, else None"""
+    if post.get('ai_summary') and post.get('ai_summary_key') == summary_cache_key(post.get('title', ''), post.get('content', '')):
+        return post['ai_summary']
+    return None
+
+def summary_fields(key, summary):
+    return {
+        'ai_summary': summary,
+        'ai_summary_key': key,
+        'ai_summary_generated_at': datetime.now(timezone.utc)
+    }
+
+def store_summary(post_id, key, summary):
+    posts_collection.update_one({"_id": post_id}, {"$set": summary_fields(key, summary)})
+
+class SummaryQueue:
+    """Summary jobs on the job runner, one per post revision"""
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, runner, max_attempts, retry_base_seconds, rerun_cooldown_seconds):
+        self.runner = runner
+        self.rerun_cooldown_seconds = rerun_cooldown_seconds
+        runner.register('summary', self._run, max_attempts=max_attempts, retry_base_seconds=retry_base_seconds)
+        # Readers arriving together for the same revision share one model call and one job lookup
+        self.generations = SingleFlight()
+        self.lookups = SingleFlight()
+
+    def enqueue(self, post_id, title, content, rerun=False, priority=0):
+        """Queue a summary for this revision of the post and return its job
+
+        With rerun, a job for this revision that finished but whose summary is no longer on
+        the post is queued again, and so is one that failed every attempt once it has been
+        failed for rerun_cooldown_seconds.
+        """
+        key = summary_cache_key(title, content)
+        job_id = f"summary:{post_id}:{key}"
+        return self.lookups.do(('enqueue', job_id, rerun, priority), self._enqueue, post_id, key, job_id, rerun, priority)
+
+    def _enqueue(self, post_id, key, job_id, rerun, priority):
+        if rerun:
+            # A job that finished in the meantime just finds the summary stored and ends again
+            self.runner.retry(job_id, statuses=('done',))
+            # Until the cooldown passes a failed job stays failed, so readers cannot keep
+            # restarting its attempts against a model that keeps failing
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.rerun_cooldown_seconds)
+            self.runner.retry(job_id, finished_before=cutoff)
+        return self.runner.enqueue('summary', {'post_id': post_id, 'key': key}, job_id=job_id, priority=priority)
+
+    def wait(self, job_id, timeout):
+        """Poll a job until it is no longer pending or running, or until timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        job = self.runner.get(job_id)
+        while job and job['status'] in ('pending', 'running') and time.monotonic() < deadline:
+            job = self.lookups.do(('poll', job_id), self._poll, job_id)
+        return job
+
+    def _poll(self, job_id):
+        # Waiters that join during the sleep share the read at the end of it
+        time.sleep(self.POLL_INTERVAL)
+        return self.runner.get(job_id)
+
+    def _run(self, job):
+        post_id, key = job['payload']['post_id'], job['payload']['key']
+        post = posts_collection.find_one({'_id': post_id}, projection(['title', 'content', 'ai_summary', 'ai_summary_key']))
+        # The post was deleted or edited since the job was queued; the edit queued its own job
+        if not post or summary_cache_key(post.get('title', ''), post.get('content', '')) != key:
+            return 'superseded'
+        if get_stored_summary(post):
+            return 'done'
+        summary = self.generations.do(key, generate_ai_summary, post.get('content') or '', post.get('title', ''))
+        if not summary:
+            raise ValueError('No summary returned by the model')
+        store_summary(post['_id'], key, summary)
+
+summary_queue = SummaryQueue(
+    job_runner, app.config['SUMMARY_MAX_ATTEMPTS'], app.config['SUMMARY_RETRY_BASE_SECONDS'],
+    app.config['SUMMARY_RERUN_COOLDOWN_SECONDS']
+)
+
+# Longest a client may hold a request open with ?wait= on the summary endpoint
+MAX_SUMMARY_WAIT_SECONDS = 30
+# Comment lines sent on an idle summary stream so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = 15
+
+def enqueue_summary(post_id, title, content):
+    """Pre-warm the summary for a newly written revision of a post"""
+    if not gemini_model or len((content or '').strip()) < 5:
+        return
+    try:
+        summary_queue.enqueue(post_id, title, content)
+    except PyMongoError as e:
+        print(f"Error queueing summary for post {post_id}: {e}")
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per minute, in bursts of at most `burst`"""
+
+    def __init__(self, rate, burst=1):
+        self.interval = 60.0 / rate
+        self.burst = burst
+        self._allowance = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._allowance = min(self.burst, self._allowance + (now - self._last) / self.interval)
+                self._last = now
+                if self._allowance >= 1:
+                    self._allowance -= 1
+                    return
+                delay = (1 - self._allowance) * self.interval
+            time.sleep(delay)
+
+class StubSummaryModel:
+    """Offline stand-in for gemini_model that "summarizes" a post as its opening words"""
+
+    summary_model_name = 'stub'
+
+    def generate_content(self, prompt):
+        content = prompt.split('Content:', 1)[-1].split('Summary:', 1)[0].strip()
+        return SimpleNamespace(text=' '.join(content.split()[:30]))
+
+SUMMARY_BACKFILL_CHECKPOINT = 'summary_backfill'
+
+def _backfill_summary(post, key, limiter, retries):
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(60, 2 ** attempt))
+        summary = summary_queue.generations.do(key, generate_ai_summary, post.get('content') or '', post.get('title', ''), limiter)
+        if summary:
+            return summary
+    return None
+
+def backfill_summaries(concurrency=4, rate=15, batch_size=50, retries=2, limit=0, restart=False, dry_run=False):
+    """Summarize every post without a current summary, resuming from the last checkpoint
+
+    Posts are read in _id order, batch_size at a time. Each batch is summarized with
+    `concurrency` model calls in flight (at most `rate` per minute), written back with
+    one bulk write, and then checkpointed. Returns the counts for the run.
+
+    With dry_run, posts are checked against the Gemini key, as a real run would, and
+    summarized, but no summary or checkpoint is written.
+    """
+    if restart and not dry_run:
+        checkpoints_collection.delete_one({'_id': SUMMARY_BACKFILL_CHECKPOINT})
+    checkpoint = None if dry_run else checkpoints_collection.find_one({'_id': SUMMARY_BACKFILL_CHECKPOINT})
+    last_id = checkpoint['last_id'] if checkpoint else None
+    if last_id:
+        print(f"Resuming after post {last_id}")
+
+    limiter = RateLimiter(rate, burst=concurrency)
+    counts = {'scanned': 0, 'summarized': 0, 'current': 0, 'skipped': 0, 'failed': 0}
+    finished = False
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='summary-backfill') as executor:
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id else {}
+            batch = list(posts_collection.find(query, projection(['title', 'content', 'ai_summary_key']))
+                         .sort('_id', ASCENDING).limit(batch_size))
+            if not batch:
+                finished = True
+                break
+
+            todo = []
+            scanned = 0
+            for post in batch:
+                if limit and len(todo) >= limit - counts['summarized'] - counts['failed']:
+                    break
+                scanned += 1
+                key = summary_cache_key(post.get('title', ''), post.get('content', ''), GEMINI_MODEL_NAME if dry_run else None)
+                if post.get('ai_summary_key') == key:
+                    counts['current'] += 1
+                elif len((post.get('content') or '').strip()) < 5:
+                    counts['skipped'] += 1
+                else:
+                    todo.append((post, key))
+            batch = batch[:scanned]
+
+            summaries = executor.map(lambda item: _backfill_summary(item[0], item[1], limiter, retries), todo)
+            writes = []
+            for (post, key), summary in zip(todo, summaries):
+                if summary:
+                    writes.append(UpdateOne({'_id': post['_id']}, {'$set': summary_fields(key, summary)}))
+                else:
+                    counts['failed'] += 1
+            if writes and not dry_run:
+                posts_collection.bulk_write(writes, ordered=False)
+            counts['summarized'] += len(writes)
+            counts['scanned'] += len(batch)
+
+            last_id = batch[-1]['_id']
+            if not dry_run:
+                checkpoints_collection.update_one({'_id': SUMMARY_BACKFILL_CHECKPOINT}, {'$set': {
+                    'last_id': last_id,
+                    'updated_at': datetime.now(timezone.utc)
+                }}, upsert=True)
+            print(f"{'Dry run at' if dry_run else 'Checkpoint'} {last_id}: {counts['summarized']} summarized, {counts['current']} up to date, "
+                  f"{counts['skipped']} too short, {counts['failed']} failed")
+            if limit and counts['summarized'] + counts['failed'] >= limit:
+                break
+
+    # A complete pass starts over next time, which also retries the posts that failed
+    if finished and not dry_run:
+        checkpoints_collection.delete_one({'_id': SUMMARY_BACKFILL_CHECKPOINT})
+    return counts
+
+@app.cli.command('backfill-summaries')
+@click.option('--concurrency', default=4, show_default=True, help='Model calls in flight at once.')
+@click.option('--rate', default=app.config['SUMMARY_RATE_LIMIT_PER_MINUTE'], show_default=True, help='Maximum model calls per minute.')
+@click.option('--batch-size', default=50, show_default=True, help='Posts per bulk write and checkpoint.')
+@click.option('--retries', default=2, show_default=True, help='Retries per post, with exponential backoff.')
+@click.option('--limit', default=0, help='Stop after this many posts have been attempted.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first post.')
+@click.option('--stub-model', is_flag=True, help='Dry run with an offline stub model instead of Gemini; no summary or checkpoint is written.')
+def backfill_summaries_command(concurrency, rate, batch_size, retries, limit, restart, stub_model):
+    """Generate AI summaries for posts that have none or a stale one"""
+    global gemini_model, summary_chunks_collection
+    if stub_model:
+        gemini_model = StubSummaryModel()
+        # Section summaries of long posts go to a scratch collection, dropped afterwards
+        summary_chunks_collection = db['summary_chunks_dry_run']
+    if not gemini_model:
+        raise click.ClickException('AI service not available: set GEMINI_API_KEY or pass --stub-model')
+    try:
+        counts = backfill_summaries(concurrency, rate, batch_size, retries, limit, restart, dry_run=stub_model)
+    finally:
+        if stub_model:
+            summary_chunks_collection.drop()
+    print(f"{'Dry run done' if stub_model else 'Done'}: scanned {counts['scanned']} posts, summarized {counts['summarized']}, "
+          f"{counts['current']} already up to date, {counts['skipped']} too short, {counts['failed']} failed")
+
+# Outbound email: messages are queued as jobs and sent by background workers
+class SMTPPool:
+    """Open Flask-Mail connections kept for reuse, so each message does not pay for a new SMTP and TLS handshake"""
+
+    def __init__(self, mail, size, max_idle):
+        self.mail = mail
+        self.size = size
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def acquire(self):
+        """An idle connection that still answers NOOP, or a new one; needs an app context"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used <= self.max_idle and self._alive(connection):
+                self.reused += 1
+                return connection
+            self._close(connection)
+        connection = self.mail.connect()
+        connection.__enter__()  # opens the session: connect, STARTTLS and login
+        self.opened += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((connection, time.monotonic()))
+                    return
+        else:
+            self.discarded += 1
+        self._close(connection)
+
+    def _alive(self, connection):
+        if connection.host is None:  # MAIL_SUPPRESS_SEND
+            return True
+        try:
+            return connection.host.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self, connection):
+        try:
+            if connection.host is not None:
+                connection.host.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+        return {'opened': self.opened, 'reused': self.reused, 'discarded': self.discarded, 'idle': idle}
+
+class EmailOutbox:
+    """Outgoing mail sent by the job runner over pooled SMTP connections and retried with backoff"""
+
+    def __init__(self, runner, pool, max_attempts, retry_base_seconds):
+        self.runner = runner
+        self.pool = pool
+        # Password resets are waited on by a person, so they go ahead of summaries
+        runner.register('email', self._run, max_attempts=max_attempts, retry_base_seconds=retry_base_seconds, priority=10)
+
+    def enqueue(self, subject, recipients, body, sender=None):
+        """Queue a plain-text message and return its job id; it is sent in the background"""
+        return self.runner.enqueue('email', {
+            'subject': subject,
+            'sender': sender or app.config['MAIL_USERNAME'],
+            'recipients': recipients,
+            'body': body
+        })['_id']
+
+    def _run(self, job):
+        payload = job['payload']
+        msg = Message(payload['subject'], sender=payload['sender'], recipients=payload['recipients'], body=payload['body'])
+        connection = self.pool.acquire()
+        try:
+            connection.send(msg)
+        except Exception as e:
+            if self._is_permanent(e):
+                self.pool.release(connection)
+                raise PermanentJobError(str(e))
+            # The session may be half-closed; drop it and let the job be retried on a fresh one
+            self.pool.release(connection, broken=True)
+            raise
+        self.pool.release(connection)
+
+    def _is_permanent(self, error):
+        """5xx replies and malformed messages will fail again; 4xx replies and dropped connections may not"""
+        if isinstance(error, BadHeaderError):
+            return True
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code >= 500
+        return False
+
+email_outbox = EmailOutbox(
+    job_runner,
+    SMTPPool(mail, app.config['JOB_WORKERS'], app.config['EMAIL_SMTP_MAX_IDLE_SECONDS']),
+    app.config['EMAIL_MAX_ATTEMPTS'],
+    app.config['EMAIL_RETRY_BASE_SECONDS']
+)
+
+def run_job_worker(threads, types=(), burst=False):
+    """Run background jobs on this process until interrupted, or with burst until none are due"""
+    email_outbox.pool.size = threads
+    print(f"Job worker {job_runner.worker_id}: {threads} threads, job types: {', '.join(types) or 'all'}")
+    job_runner.start(threads, types, burst)
+    try:
+        job_runner.join()
+    except KeyboardInterrupt:
+        print("Stopping after the running jobs finish")
+    finally:
+        job_runner.stop()
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+@jobs_cli.command('worker')
+@click.option('--threads', default=4, show_default=True, help='Worker threads per process.')
+@click.option('--processes', default=1, show_default=True, help='Worker processes to run.')
+@click.option('--type', 'types', multiple=True, help='Only run jobs of this type; repeat for several.')
+@click.option('--burst', is_flag=True, help='Exit once no jobs are due.')
+def jobs_worker_command(threads, processes, types, burst):
+    """Run background jobs outside the web server"""
+    # Spawned processes import the app afresh, so each has its own MongoDB client
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=run_job_worker, args=(threads, types, burst)) for _ in range(processes - 1)]
+    for child in children:
+        child.start()
+    try:
+        run_job_worker(threads, types, burst)
+    finally:
+        for child in children:
+            child.join()
+
+@jobs_cli.command('stats')
+def jobs_stats_command():
+    """Show job counts by type and status"""
+    for job_type, counts in sorted(job_runner.stats()['types'].items()):
+        print(f"{job_type}: " + ', '.join(f"{count} {status}" for status, count in counts.items()))
+
+app.cli.add_command(jobs_cli)
+
+# JWT tokens
+class TokenRevocations:
+    """Revoked access token ids and per-user revocation times, mirrored in memory from revoked_tokens.
+
+    Revocations are written to MongoDB and every worker re-reads the (TTL-pruned)
+    collection every JWT_REVOCATION_SYNC_SECONDS, so checks never wait on the database.
+    Refresh tokens are not listed here: they are checked against refresh_tokens when used.
+    """
+
+    def __init__(self, sync_seconds):
+        self.sync_seconds = sync_seconds
+        self._token_ids = set()
+        self._users = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_seconds:
+            return
+        with self._lock:
+            if self._synced_at is not None and now - self._synced_at < self.sync_seconds:
+                return
+            try:
+                token_ids, users = set(), {}
+                for entry in revoked_tokens_collection.find({}, {'jti': 1, 'user_id': 1, 'revoked_before': 1}):
+                    if 'jti' in entry:
+                        token_ids.add(entry['jti'])
+                    else:
+                        users[entry['user_id']] = entry['revoked_before']
+                self._token_ids, self._users = token_ids, users
+            except PyMongoError as e:
+                print(f"Error syncing token revocations: {e}")
+            self._synced_at = now
+
+    def revoke_token(self, claims):
+        """Revoke a single access token until it expires"""
+        if 'jti' not in claims:
+            return
+        revoked_tokens_collection.update_one(
+            {'_id': f"jti:{claims['jti']}"},
+            {'$set': {'jti': claims['jti'], 'expires_at': datetime.fromtimestamp(claims['exp'], timezone.utc)}},
+            upsert=True
+        )
+        with self._lock:
+            self._token_ids.add(claims['jti'])
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to a user so far, e.g. after a password reset"""
+        revoked_before = int(time.time())
+        revoked_tokens_collection.update_one(
+            {'_id': f"user:{user_id}"},
+            {'$set': {
+                'user_id': str(user_id),
+                'revoked_before': revoked_before,
+                'expires_at': datetime.now(timezone.utc) + timedelta(days=app.config['JWT_REFRESH_TOKEN_DAYS'])
+            }},
+            upsert=True
+        )
+        end_refresh_families(user_id)
+        with self._lock:
+            self._users[str(user_id)] = revoked_before
+
+    def is_revoked(self, claims):
+        self._sync()
+        if claims.get('jti') in self._token_ids:
+            return True
+        revoked_before = self._users.get(str(claims.get('user_id')))
+        # Tokens issued before iat existed cannot be dated, so a user revocation covers them too
+        return revoked_before is not None and claims.get('iat', 0) <= revoked_before
+
+token_revocations = TokenRevocations(app.config['JWT_REVOCATION_SYNC_SECONDS'])
+
+def _encode_token(user, token_type, lifetime, jti=None, family=None):
+    now = datetime.now(timezone.utc)
+    claims = {
+        'user_id': user.id,
+        'username': user.username,
+        'type': token_type,
+        'jti': jti or secrets.token_urlsafe(16),
+        'iat': now,
+        'exp': now + lifetime
+    }
+    if family:
+        claims['family'] = family
+    return jwt.encode(claims, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+# Refresh tokens rotate within a family started at login. The family's document holds the
+# id of its newest refresh token, the only one that can still be exchanged, so a session
+# costs one document however often it refreshes.
+def rotate_refresh_token(claims):
+    """Move a refresh token's family on to a new token id and return it, or None if this token may not be exchanged"""
+    jti = secrets.token_urlsafe(16)
+    result = refresh_tokens_collection.update_one(
+        {'_id': claims['family'], 'jti': claims['jti']},
+        {'$set': {'jti': jti, 'expires_at': datetime.now(timezone.utc) + timedelta(days=app.config['JWT_REFRESH_TOKEN_DAYS'])}}
+    )
+    if not result.matched_count:
+        # An older token of the family came back, so it may have been copied: end the session
+        refresh_tokens_collection.delete_one({'_id': claims['family']})
+        return None
+    return jti
+
+def end_refresh_family(claims):
+    """Log out one session: none of its refresh tokens can be exchanged any more"""
+    if claims.get('family'):
+        refresh_tokens_collection.delete_one({'_id': claims['family']})
+
+def end_refresh_families(user_id):
+    refresh_tokens_collection.delete_many({'user_id': str(user_id)})
+
+def issue_tokens(user, family=None, refresh_jti=None):
+    """Access and refresh tokens for an API login, in the shape the API returns them
+
+    Without a family (a login), the refresh token starts a new one; a refresh passes the
+    family and the token id rotate_refresh_token() moved it to.
+    """
+    refresh_lifetime = timedelta(days=app.config['JWT_REFRESH_TOKEN_DAYS'])
+    if family is None:
+        family, refresh_jti = secrets.token_urlsafe(16), secrets.token_urlsafe(16)
+        refresh_tokens_collection.insert_one({
+            '_id': family,
+            'jti': refresh_jti,
+            'user_id': user.id,
+            'expires_at': datetime.now(timezone.utc) + refresh_lifetime
+        })
+    return {
+        'token': _encode_token(user, 'access', timedelta(minutes=app.config['JWT_ACCESS_TOKEN_MINUTES'])),
+        'refresh_token': _encode_token(user, 'refresh', refresh_lifetime, refresh_jti, family),
+        'expires_in': app.config['JWT_ACCESS_TOKEN_MINUTES'] * 60
+    }
+
+class TokenUser:
+    """Current user built from verified token claims, for handlers that only need id and username"""
+
+    def __init__(self, claims):
+        self.id = claims['user_id']
+        self.username = claims['username']
+
 # JWT token decorator for API endpoints
-def token_required(f):
+def token_required(f=None, stateless=False):
+    """Require a valid access token.
+
+    With stateless=True and JWT_STATELESS_AUTH enabled, the handler gets a TokenUser
+    from the signed claims and the users collection is not queried. Only read-only
+    endpoints may opt in: a deleted or deactivated user keeps a valid token until it expires.
+    """
+    if f is None:
+        return lambda func: token_required(func, stateless=stateless)
+
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
@@ -155,10 +1538,18 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token[7:]
             data = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-            current_user_obj = User.get(current_user_id)
-            if not current_user_obj:
+            if data.get('type', 'access') != 'access':
                 return jsonify({'message': 'Token is invalid!'}), 401
+            if token_revocations.is_revoked(data):
+                return jsonify({'message': 'Token has been revoked!'}), 401
+            # Only tokens carrying a jti are short-lived enough to trust without a lookup
+            if stateless and app.config['JWT_STATELESS_AUTH'] and 'jti' in data:
+                current_user_obj = TokenUser(data)
+            else:
+                current_user_id = data['user_id']
+                current_user_obj = User.get(current_user_id)
+                if not current_user_obj:
+                    return jsonify({'message': 'Token is invalid!'}), 401
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'Token has expired!'}), 401
         except jwt.InvalidTokenError:
@@ -170,35 +1561,975 @@ def token_required(f):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def parse_content_for_display(content):
+def upload_name(filename):
+    """Path of an upload relative to the upload folder, refusing anything that could escape it"""
+    return filename if UPLOAD_NAME_PATTERN.match(filename) else os.path.basename(filename)
+
+def upload_url(name):
+    return url_for('static', filename=f'uploads/{name}')
+
+def save_upload(file):
+    """Store an uploaded file under the SHA-256 of its bytes and return its name in the upload folder
+
+    The file is hashed while it is streamed to a temporary file, so it is read once. Uploading
+    bytes that are already stored reuses the existing file, resized variants included.
+    """
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    folder = app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_READ_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        hexdigest = digest.hexdigest()
+        name = f"{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}.{extension}"
+        now = datetime.now(timezone.utc)
+        previous = uploads_collection.find_one_and_update(
+            {'_id': name},
+            {'$set': {'last_uploaded_at': now}, '$setOnInsert': {'refs': 0, 'created_at': now}},
+            upsert=True
+        )
+        path = os.path.join(folder, name)
+        if previous is None or not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    try:
+        if previous is None:
+            enqueue_image_processing(name, upload_url(name))
+        if not previous or previous['refs'] <= 0:
+            # Removed later unless a saved post starts referencing it
+            job_runner.enqueue('delete_upload', {'filename': name}, delay=app.config['UPLOAD_ORPHAN_SECONDS'])
+    except PyMongoError as e:
+        print(f"Error queueing jobs for upload {name}: {e}")
+    return name
+
+def upload_refs(*texts):
+    """Names of the stored uploads that post content or URLs point at"""
+    return sorted({name for text in texts if text for name in UPLOAD_URL_PATTERN.findall(text)})
+
+def change_upload_refs(old_refs, new_refs):
+    """Move a post's upload reference counts from old_refs to new_refs, queueing deletion of files nothing uses"""
+    old_refs, new_refs = set(old_refs or []), set(new_refs or [])
+    for name in new_refs - old_refs:
+        uploads_collection.update_one({'_id': name}, {'$inc': {'refs': 1}})
+    for name in old_refs - new_refs:
+        upload = uploads_collection.find_one_and_update(
+            {'_id': name}, {'$inc': {'refs': -1}}, return_document=ReturnDocument.AFTER
+        )
+        if upload and upload['refs'] <= 0:
+            job_runner.enqueue('delete_upload', {'filename': name})
+
+def apply_upload_variants(post_id, name):
+    """Copy an already processed hero banner's variants onto the post"""
+    upload = uploads_collection.find_one({'_id': name}, {'variants': 1})
+    if upload and upload.get('variants'):
+        posts_collection.update_one({'_id': post_id}, {'$set': {'hero_banner_variants': upload['variants']}})
+
+def upload_is_final(name):
+    """Whether a stored upload's bytes will not change again: variants are written once, originals once processed"""
+    match = UPLOAD_NAME_PATTERN.match(name)
+    if not match:
+        return False
+    if Image is None or match.group(1):
+        return True
+    folder = app.config['UPLOAD_FOLDER']
+    return any(os.path.exists(os.path.join(folder, derived)) for derived in image_derived_filenames(name))
+
+@app.after_request
+def cache_stored_uploads(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        filename = (request.view_args or {}).get('filename', '')
+        if filename.startswith('uploads/') and upload_is_final(filename[len('uploads/'):]):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = UPLOAD_CACHE_SECONDS
+            response.cache_control.immutable = True
+    return response
+
+def delete_upload(job):
+    """Job handler: remove a file from the upload folder, with any resized copies made of it"""
+    filename = upload_name(job['payload']['filename'])
+    if UPLOAD_NAME_PATTERN.match(filename):
+        # Stored uploads go only once nothing references them and nobody has just uploaded them again
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=app.config['UPLOAD_ORPHAN_SECONDS'])
+        if not uploads_collection.find_one_and_delete(
+            {'_id': filename, 'refs': {'$lte': 0}, 'last_uploaded_at': {'$lte': cutoff}}
+        ):
+            upload = uploads_collection.find_one({'_id': filename}, {'refs': 1, 'last_uploaded_at': 1})
+            if upload and upload['refs'] <= 0:
+                # Unused but uploaded again recently: look again once that upload's grace period is over
+                remaining = (_as_utc(upload['last_uploaded_at']) - cutoff).total_seconds()
+                job_runner.enqueue('delete_upload', {'filename': filename}, delay=max(0, remaining))
+            return 'superseded'
+    for name in [filename] + image_derived_filenames(filename):
+        path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+        if os.path.exists(path):
+            os.remove(path)
+
+job_runner.register('delete_upload', delete_upload, max_attempts=3)
+
+# Uploaded images: the upload is re-encoded in place without its metadata and capped at the
+# largest variant width, and smaller copies plus WebP versions are written next to it for srcset
+IMAGE_VARIANTS = [('thumb', 320), ('card', 800), ('full', 1600)]
+IMAGE_QUALITY = 82
+
+def image_variant_filename(filename, name, ext=None):
+    stem, original_ext = os.path.splitext(filename)
+    suffix = '' if name == 'full' else f'-{name}'
+    return f"{stem}{suffix}{ext or original_ext}"
+
+def image_derived_filenames(filename):
+    """Every file process_image_file may write next to an upload, not counting the upload itself"""
+    names = []
+    for name, _ in IMAGE_VARIANTS:
+        for ext in (None, '.webp'):
+            derived = image_variant_filename(filename, name, ext)
+            if derived != filename and derived not in names:
+                names.append(derived)
+    return names
+
+def _save_image(image, path, image_format, icc_profile=None):
+    # Written to a temporary file first so a half-written image is never served
+    temp_path = f"{path}.tmp"
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format == 'JPEG':
+        image.convert('RGB').save(temp_path, 'JPEG', quality=IMAGE_QUALITY, optimize=True, progressive=True, **options)
+    elif image_format == 'WEBP':
+        image.save(temp_path, 'WEBP', quality=IMAGE_QUALITY, method=4, **options)
+    else:
+        image.save(temp_path, image_format, optimize=True, **options)
+    os.replace(temp_path, path)
+
+def process_image_file(filename, url):
+    """Strip an upload's metadata and write its variants; returns them for srcset, or None if it was left alone"""
+    folder = app.config['UPLOAD_FOLDER']
+    with Image.open(os.path.join(folder, filename)) as source:
+        image_format = source.format
+        if image_format == 'MPO':
+            # Phone photos carry a depth map or preview as extra frames; the first is the photo
+            source.seek(0)
+            image_format = 'JPEG'
+        elif getattr(source, 'is_animated', False):
+            # Resizing an animation would keep only its first frame
+            return None
+        icc_profile = source.info.get('icc_profile')
+        # Applies the EXIF orientation; the saved copies carry no EXIF at all
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    base_url = url.rsplit('/', 1)[0]
+    width, height = image.size
+    variants = []
+    for name, target_width in IMAGE_VARIANTS:
+        if name != 'full' and target_width >= width:
+            continue
+        resized = image
+        if target_width < width:
+            resized = image.resize((target_width, max(1, round(height * target_width / width))), Image.LANCZOS)
+        variant = image_variant_filename(filename, name)
+        _save_image(resized, os.path.join(folder, variant), image_format, icc_profile)
+        webp_variant = image_variant_filename(filename, name, '.webp')
+        if webp_variant != variant:
+            _save_image(resized, os.path.join(folder, webp_variant), 'WEBP', icc_profile)
+        variants.append({
+            'name': name,
+            'width': resized.width,
+            'height': resized.height,
+            'url': f"{base_url}/{os.path.basename(variant)}",
+            'webp_url': f"{base_url}/{os.path.basename(webp_variant)}"
+        })
+    return variants
+
+def process_image(job):
+    """Job handler: process an upload and store its variants on it and on posts using it as hero banner"""
+    payload = job['payload']
+    filename = upload_name(payload['filename'])
+    if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        return 'superseded'
+    try:
+        variants = process_image_file(filename, payload['url'])
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise PermanentJobError(f"Cannot process {filename}: {e}")
+    if variants:
+        # The upload first, so a post saved meanwhile either is updated here or finds them via apply_upload_variants
+        uploads_collection.update_one({'_id': filename}, {'$set': {'variants': variants}})
+        posts_collection.update_many({'hero_banner_url': payload['url']}, {'$set': {'hero_banner_variants': variants}})
+        invalidate_pages(*[post['slug'] for post in posts_collection.find({'hero_banner_url': payload['url']}, {'slug': 1})])
+
+if Image is not None:
+    job_runner.register('process_image', process_image, max_attempts=3)
+
+def enqueue_image_processing(filename, url):
+    """Resize a new upload in the background"""
+    if Image is None:
+        return
+    try:
+        job_runner.enqueue('process_image', {'filename': filename, 'url': url}, priority=5)
+    except PyMongoError as e:
+        print(f"Error queueing image processing for {filename}: {e}")
+
+@app.template_filter('srcset')
+def srcset_filter(variants, key='url'):
+    """srcset attribute value for a list of image variants"""
+    return ', '.join(f"{variant[key]} {variant['width']}w" for variant in variants)
+
+# Markdown rendering
+# All constructs are matched by one compiled pattern in a single left-to-right
+# scan. Alternatives are listed in the order the constructs were historically
+# applied, and text captured by a construct is rendered again so nested markup
+# (e.g. **bold** inside a link or *italic*) still comes out the same.
+_EMBED_HTML = '<div class="embed-responsive embed-responsive-16by9 mb-2"><iframe class="embed-responsive-item" src="{}" allowfullscreen></iframe></div>'
+
+# Bracketed text and URLs stop at the next "[", so a failed match never scans past the
+# next place a match could start, and the whole scan stays linear in the content length
+_IMAGE = r'!\[[^\[\]\n]*\]\([^\[)\s]*\)'
+
+_INLINE_TOKENS = [
     # Basic image: ![alt text](image_url)
-    content = re.sub(r'(?<!<img src=")\!\[(.*?)\]\((.*?)\)(?!">)', r'<img src="\2" alt="\1" class="img-fluid mb-2">', content)
-    # Basic link: [link text](url)
-    content = re.sub(r'\[(.*?)\]\((http[s]?://.*?)\)', r'<a href="\2" target="_blank" rel="noopener noreferrer">\1</a>', content)
+    ('image', r'(?<!<img src=")!\[(?P<image_alt>[^\[\]\n]*)\]\((?P<image_url>[^\[)\s]*)\)(?!">)'),
+    # Basic link: [link text](url), whose text may be an image
+    ('link', rf'\[(?P<link_text>(?:[^\[\]\n]|{_IMAGE})*)\]\((?P<link_url>https?://[^\[)\s]*)\)'),
     # Basic YouTube embed: [youtube](video_id_or_url)
-    content = re.sub(r'\[youtube\]\((?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)?([a-zA-Z0-9_-]{11})\)', r'<div class="embed-responsive embed-responsive-16by9 mb-2"><iframe class="embed-responsive-item" src="https://www.youtube.com/embed/\1" allowfullscreen></iframe></div>', content)
+    ('youtube', r'\[youtube\]\((?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)?(?P<youtube_id>[a-zA-Z0-9_-]{11})\)'),
     # Basic generic iframe embed: [embed](url)
-    content = re.sub(r'\[embed\]\((http[s]?://.*?)\)', r'<div class="embed-responsive embed-responsive-16by9 mb-2"><iframe class="embed-responsive-item" src="\1" allowfullscreen></iframe></div>', content)
+    ('embed', r'\[embed\]\((?P<embed_url>https?://[^\[)\s]*)\)'),
+    # Bold italic text: ***text***
+    ('bold_italic', r'\*\*\*(?P<bold_italic_text>[^*\n]+)\*\*\*'),
     # Bold text: **text**
-    content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', content)
-    # Italic text: *text*
-    content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', content)
+    ('bold', r'\*\*(?P<bold_text>.*?)\*\*'),
+    # Italic text: *text*, which may wrap a **bold** span but never closes on the start of one
+    ('italic', r'\*(?P<italic_text>(?:[^*\n]|\*\*(?:[^*\n]|\*(?!\*))*\*\*)*?)\*(?!\*(?:[^*\n]|\*(?!\*))*\*\*)'),
     # Strikethrough: ~~text~~
-    content = re.sub(r'~~(.*?)~~', r'<del>\1</del>', content)
+    ('strike', r'~~(?P<strike_text>.*?)~~'),
     # Code: `code`
-    content = re.sub(r'`(.*?)`', r'<code>\1</code>', content)
-    # Headers
-    content = re.sub(r'^### (.*$)', r'<h3>\1</h3>', content, flags=re.MULTILINE)
-    content = re.sub(r'^## (.*$)', r'<h2>\1</h2>', content, flags=re.MULTILINE)
-    # Quote
-    content = re.sub(r'^> (.*$)', r'<blockquote>\1</blockquote>', content, flags=re.MULTILINE)
-    # List items
-    content = re.sub(r'^- (.*$)', r'<li>\1</li>', content, flags=re.MULTILINE)
+    ('code', r'`(?P<code_text>[^`\n]*)`'),
+]
+# Headers, quotes and list items wrap the rest of their line
+_LINE_TOKEN = ('line', r'^(?P<line_marker>### |## |> |- )(?P<line_text>.*)$')
+_LINE_TAGS = {'### ': 'h3', '## ': 'h2', '> ': 'blockquote', '- ': 'li'}
+
+def _compile_tokens(tokens):
+    # The leading lookahead lets the regex engine skip plain text between tokens
+    alternatives = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in tokens)
+    return re.compile(f'(?=[!\\[*~`#>-])(?:{alternatives})', re.MULTILINE)
+
+_INLINE_PATTERN = _compile_tokens(_INLINE_TOKENS)
+_CONTENT_PATTERN = _compile_tokens([_LINE_TOKEN] + _INLINE_TOKENS)
+
+def _render_inline(text):
+    return _INLINE_PATTERN.sub(_render_token, text)
+
+def _render_token(match):
+    kind = match.lastgroup
+    if kind == 'image':
+        return f'<img src="{_render_inline(match.group("image_url"))}" alt="{_render_inline(match.group("image_alt"))}" class="img-fluid mb-2">'
+    if kind == 'link':
+        return f'<a href="{_render_inline(match.group("link_url"))}" target="_blank" rel="noopener noreferrer">{_render_inline(match.group("link_text"))}</a>'
+    if kind == 'youtube':
+        return _EMBED_HTML.format(f'https://www.youtube.com/embed/{match.group("youtube_id")}')
+    if kind == 'embed':
+        return _EMBED_HTML.format(_render_inline(match.group('embed_url')))
+    if kind == 'bold_italic':
+        return f'<strong><em>{_render_inline(match.group("bold_italic_text"))}</em></strong>'
+    if kind == 'bold':
+        return f'<strong>{_render_inline(match.group("bold_text"))}</strong>'
+    if kind == 'italic':
+        return f'<em>{_render_inline(match.group("italic_text"))}</em>'
+    if kind == 'strike':
+        return f'<del>{_render_inline(match.group("strike_text"))}</del>'
+    if kind == 'code':
+        return f'<code>{_render_inline(match.group("code_text"))}</code>'
+    tag = _LINE_TAGS[match.group('line_marker')]
+    return f'<{tag}>{_render_inline(match.group("line_text"))}</{tag}>'
+
+def render_markdown(content):
+    """Render post content to HTML, bypassing the render cache"""
+    content = _CONTENT_PATTERN.sub(_render_token, content)
     # Newlines to br
     if not any(tag in content for tag in ['<pre', '<div', '<p']):
         content = content.replace('\n', '<br>')
     return content
 
+class RenderCache:
+    """Thread-safe LRU of rendered HTML keyed by content hash and renderer version, bounded in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(content):
+        return f"{RENDERER_VERSION}:{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+
+    def get(self, content):
+        key = self.key(content)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, content, html):
+        key = self.key(content)
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key).encode('utf-8'))
+            self._entries[key] = html
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.encode('utf-8'))
+                self.evictions += 1
+
+    def invalidate(self, content):
+        key = self.key(content or '')
+        with self._lock:
+            html = self._entries.pop(key, None)
+            if html is not None:
+                self._bytes -= len(html.encode('utf-8'))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+render_cache = RenderCache(app.config['RENDER_CACHE_MAX_BYTES'])
+
+def parse_content_for_display(content):
+    html = render_cache.get(content)
+    if html is None:
+        html = render_markdown(content)
+        render_cache.put(content, html)
+    return html
+
+def make_excerpt(parsed_content, length=EXCERPT_LENGTH):
+    """Plain-text excerpt matching the old `striptags | truncate(150, True)` filter chain"""
+    text = Markup(parsed_content or '').striptags()
+    if len(text) <= length + 5:
+        return text
+    return text[:length - 3] + '...'
+
+def render_post_fields(content):
+    """Fields derived from post content, stored on the document at write time"""
+    parsed_content = parse_content_for_display(content or '')
+    return {
+        'parsed_content': parsed_content,
+        'excerpt': make_excerpt(parsed_content),
+        'renderer_version': RENDERER_VERSION
+    }
+
+def ensure_rendered(post):
+    """Re-render and persist a post whose stored render is missing or out of date"""
+    if post.get('renderer_version') == RENDERER_VERSION:
+        return post
+    if 'content' in post:
+        content = post['content']
+    else:
+        # Listing queries leave the body out; only stale posts pay for fetching it
+        content = (posts_collection.find_one({"_id": post['_id']}, {'content': 1}) or {}).get('content', '')
+    rendered = render_post_fields(content)
+    post.update(rendered)
+    try:
+        posts_collection.update_one({"_id": post['_id']}, {"$set": rendered})
+    except Exception as e:
+        print(f"Error storing rendered content for {post.get('slug')}: {e}")
+    return post
+
+# Slug allocation: one atomic counter per base slug, backed by the unique slug index
+SLUG_INSERT_ATTEMPTS = 5
+
+def _highest_slug_seq(base):
+    """Highest counter value already used by posts with this base slug (base is 1, base-N is N+1)"""
+    highest = 0
+    for post in posts_collection.find({'slug': {'$regex': f'^{re.escape(base)}(-[0-9]+)?$'}}, {'slug': 1, '_id': 0}):
+        suffix = post['slug'][len(base) + 1:]
+        highest = max(highest, int(suffix) + 1 if suffix else 1)
+    return highest
+
+def _next_slug_seq(base):
+    counter = slug_counters_collection.find_one_and_update(
+        {'_id': base}, {'$inc': {'seq': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+def allocate_slug(title):
+    """Reserve a unique slug for a new post in a constant number of round trips"""
+    base = slugify(title)
+    seq = _next_slug_seq(base)
+    if seq == 1:
+        # First use of this counter: skip past slugs of posts created before counters existed
+        highest = _highest_slug_seq(base)
+        if highest:
+            slug_counters_collection.update_one({'_id': base}, {'$max': {'seq': highest}})
+            seq = _next_slug_seq(base)
+    return base if seq == 1 else f"{base}-{seq - 1}"
+
+def insert_post(post_data):
+    """Insert a new post, taking the next slug if another writer claimed this one first"""
+    for _ in range(SLUG_INSERT_ATTEMPTS):
+        try:
+            return posts_collection.insert_one(post_data)
+        except DuplicateKeyError:
+            post_data.pop('_id', None)
+            post_data['slug'] = allocate_slug(post_data['title'])
+    raise RuntimeError(f"Could not allocate a unique slug for {post_data['title']!r}")
+
+# Keyset pagination over (timestamp, _id), newest first
+_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def encode_post_cursor(post):
+    """Build an opaque cursor pointing just past the given post"""
+    timestamp = post['timestamp']
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    millis = (timestamp - _CURSOR_EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{post['_id']}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_post_cursor(cursor):
+    """Return (timestamp, ObjectId) for a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        millis, post_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split(':', 1)
+        return _CURSOR_EPOCH + timedelta(milliseconds=int(millis)), ObjectId(post_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def get_page_limit(value):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE"""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+def projection(fields):
+    """MongoDB projection including only the given fields (plus _id)"""
+    fields = set(fields)
+    # MongoDB rejects a projection naming both a field and one of its subfields
+    return {field: 1 for field in fields if '.' not in field or field.split('.', 1)[0] not in fields}
+
+def get_api_fields(value):
+    """Parse a ?fields= parameter, raising ValueError on unknown names"""
+    if not value:
+        return list(API_POST_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in API_POST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def api_read_fields(fields):
+    """Fields to load for an API response; rendered fields also need renderer_version to detect stale renders"""
+    needed = set(fields)
+    if needed & {'parsed_content', 'excerpt'}:
+        needed.add('renderer_version')
+    return list(needed)
+
+def serialize_post(post, fields):
+    """JSON-safe copy of a post restricted to the requested API fields"""
+    data = {}
+    for field in fields:
+        if field not in post:
+            continue
+        value = post[field]
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        data[field] = value
+    return data
+
+def fetch_posts_page(query=None, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+    """Fetch one page of posts matching query, newest first.
+
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    Raises ValueError if cursor is malformed.
+    """
+    query = dict(query or {})
+    if cursor:
+        timestamp, post_id = decode_post_cursor(cursor)
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': post_id}}
+        ]
+    # Fetch one extra document to know whether another page exists
+    # The cursor is built from the last post's timestamp, so it is always loaded
+    posts = list(posts_collection.find(query, projection(set(fields) | {'timestamp'}) if fields else None)
+                 .sort([('timestamp', -1), ('_id', -1)]).limit(limit + 1))
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_post_cursor(posts[-1])
+    return posts, next_cursor
+
+# Tags: tag_counts holds the number of posts per tag, kept up to date by every write
+# so the tag cloud is a read of its top entries rather than an aggregation over all posts
+def change_tag_counts(old_tags, new_tags):
+    """Apply a post's tag changes to tag_counts; tags no post uses any more are removed"""
+    old_tags = {tag for tag in old_tags or [] if isinstance(tag, str)}
+    new_tags = {tag for tag in new_tags or [] if isinstance(tag, str)}
+    removed = old_tags - new_tags
+    updates = [UpdateOne({'_id': tag}, {'$inc': {'count': 1}}, upsert=True) for tag in new_tags - old_tags]
+    updates += [UpdateOne({'_id': tag}, {'$inc': {'count': -1}}) for tag in removed]
+    if not updates:
+        return
+    tag_counts_collection.bulk_write(updates, ordered=False)
+    if removed:
+        tag_counts_collection.delete_many({'_id': {'$in': list(removed)}, 'count': {'$lte': 0}})
+
+def top_tags(limit=TAG_CLOUD_SIZE):
+    """Most used tags as [{'name', 'count'}], most used first"""
+    tags = tag_counts_collection.find({'count': {'$gt': 0}}).sort([('count', DESCENDING), ('_id', ASCENDING)]).limit(limit)
+    return [{'name': tag['_id'], 'count': tag['count']} for tag in tags]
+
+def rebuild_tag_counts():
+    """Recount every tag with one aggregation over all posts; returns the number of distinct tags"""
+    counts = list(posts_collection.aggregate([
+        {'$match': {'tags.0': {'$exists': True}}},
+        # A tag listed twice on one post counts once, as in change_tag_counts
+        {'$project': {'tags': {'$setUnion': ['$tags', []]}}},
+        {'$unwind': '$tags'},
+        {'$match': {'tags': {'$type': 'string'}}},
+        {'$group': {'_id': '$tags', 'count': {'$sum': 1}}}
+    ]))
+    if counts:
+        tag_counts_collection.bulk_write([UpdateOne({'_id': tag['_id']}, {'$set': {'count': tag['count']}}, upsert=True)
+                                          for tag in counts], ordered=False)
+    tag_counts_collection.delete_many({'_id': {'$nin': [tag['_id'] for tag in counts]}})
+    return len(counts)
+
+@app.cli.command('rebuild-tag-counts')
+def rebuild_tag_counts_command():
+    """Recount posts per tag, e.g. for posts written before tag counts existed"""
+    print(f"Counted {rebuild_tag_counts()} tags")
+
+# Authors: each user document carries post_count, adjusted as posts are created and deleted,
+# so an author page header never has to count posts
+def change_post_count(author_id, delta):
+    users_collection.update_one({'_id': ObjectId(author_id)}, {'$inc': {'post_count': delta}})
+
+def rebuild_post_counts():
+    """Recount every user's posts with one aggregation; returns the number of users with posts"""
+    counts = list(posts_collection.aggregate([{'$group': {'_id': '$author_id', 'count': {'$sum': 1}}}]))
+    counts = [count for count in counts if count['_id'] is not None]
+    if counts:
+        users_collection.bulk_write([UpdateOne({'_id': count['_id']}, {'$set': {'post_count': count['count']}})
+                                     for count in counts], ordered=False)
+    users_collection.update_many({'_id': {'$nin': [count['_id'] for count in counts]}}, {'$set': {'post_count': 0}})
+    return len(counts)
+
+@app.cli.command('rebuild-post-counts')
+def rebuild_post_counts_command():
+    """Recount posts per author, e.g. for users created before post counts existed"""
+    print(f"Counted posts of {rebuild_post_counts()} authors")
+
+# Full-text search over the text_search index
+def search_posts(query, page=1, limit=DEFAULT_PAGE_SIZE, fields=None):
+    """Fetch one page of posts matching a MongoDB $text query, best match first.
+
+    Returns (posts, has_next); each post carries its relevance as 'score'.
+    """
+    skip = (page - 1) * limit
+    if skip >= MAX_SEARCH_RESULTS:
+        return [], False
+    # Rank on ids and scores alone, so the sort never holds whole posts in memory. MongoDB
+    # folds the $skip and $limit into the $sort, which then keeps only the top skip + limit
+    # matches while scanning, so every match is ranked without sorting all of them
+    ranked = list(posts_collection.aggregate([
+        {'$match': {'$text': {'$search': query}}},
+        {'$project': {'_id': 1, 'score': {'$meta': 'textScore'}}},
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$skip': skip},
+        {'$limit': min(limit, MAX_SEARCH_RESULTS - skip) + 1}
+    ]))
+    has_next = len(ranked) > limit and skip + limit < MAX_SEARCH_RESULTS
+    ranked = ranked[:limit]
+    found = posts_collection.find({'_id': {'$in': [post['_id'] for post in ranked]}}, projection(fields) if fields else None)
+    posts_by_id = {post['_id']: post for post in found}
+    posts = []
+    for result in ranked:
+        post = posts_by_id.get(result['_id'])
+        if post:
+            post['score'] = result['score']
+            posts.append(post)
+    return posts, has_next
+
+def search_terms(query):
+    """Words of a search query to highlight, leaving out negated words and stop words"""
+    query = re.sub(r'(?:^|\s)-\S+', ' ', query.lower())
+    terms = []
+    for word in re.findall(r'\w+', query):
+        if len(word) < 2 or word in SEARCH_STOP_WORDS:
+            continue
+        # MongoDB matches stems ("running" finds "runs"), so highlight words sharing the stem
+        for suffix in ('ing', 'ed', 'es', 's'):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                # "running" -> "runn" -> "run"
+                if suffix in ('ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'aeiouls':
+                    word = word[:-1]
+                break
+        if word not in terms:
+            terms.append(word)
+    return terms
+
+def highlight(text, terms, length=None):
+    """Escape text and wrap words starting with a search term in <mark>; with length, keep a window around the first match"""
+    text = text or ''
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE) if terms else None
+    prefix = suffix = ''
+    if length and len(text) > length:
+        match = pattern.search(text) if pattern else None
+        start = max(0, match.start() - length // 4) if match else 0
+        if start:
+            start = text.rfind(' ', 0, start) + 1
+            prefix = '…'
+        end = start + length
+        if end < len(text):
+            space = text.rfind(' ', start, end)
+            end = space if space > start else end
+            suffix = '…'
+        text = text[start:end]
+    if not pattern:
+        return Markup(prefix) + escape(text) + Markup(suffix)
+    html, position = [], 0
+    for match in pattern.finditer(text):
+        html.append(escape(text[position:match.start()]))
+        html.append(Markup('<mark>%s</mark>') % match.group(0))
+        position = match.end()
+    html.append(escape(text[position:]))
+    return Markup(prefix) + Markup('').join(html) + Markup(suffix)
+
+def highlight_post(post, terms):
+    """Highlighted title and body snippet for a search result"""
+    body = Markup(post.get('parsed_content') or '').striptags()
+    return {
+        'title': highlight(post.get('title'), terms),
+        'snippet': highlight(body, terms, SEARCH_SNIPPET_LENGTH)
+    }
+
+# Conditional GET: ETags come from the versions of the posts a response shows, which a
+# query for VERSION_FIELDS returns, so an unchanged page is answered before it is loaded or rendered
+def _templates_digest():
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        dirs.sort()
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(name.encode('utf-8') + b'\0' + f.read())
+    return digest.hexdigest()[:16]
+
+TEMPLATES_DIGEST = _templates_digest()
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def post_version(post):
+    """Identifies what a post looked like: edits, re-renders and new image variants all change it"""
+    last_updated = post.get('last_updated') or post.get('timestamp')
+    updated = _as_utc(last_updated).isoformat() if last_updated else ''
+    return f"{post['_id']}@{updated}/{post.get('renderer_version')}/{len(post.get('hero_banner_variants') or [])}"
+
+def make_etag(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+def page_etag_parts():
+    """What an HTML page depends on besides its posts: who is looking, the templates and the footer year"""
+    user_id = current_user.id if current_user.is_authenticated else ''
+    return [user_id, TEMPLATES_DIGEST, bool(gemini_model), datetime.now(timezone.utc).year]
+
+def not_modified(etag, last_modified=None):
+    """Whether the client's If-None-Match (or, without one, If-Modified-Since) says it has this version"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return _as_utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def set_validators(response, etag, last_modified=None, html=False, vary=None):
+    """Attach the ETag and Last-Modified, and ask clients to revalidate before reusing the response
+
+    A response that depends on who asks is private, varying on the request header named by vary.
+    """
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _as_utc(last_modified)
+    response.cache_control.no_cache = True
+    if html:
+        # Pages show who is logged in
+        vary = 'Cookie'
+    if vary:
+        response.cache_control.private = True
+        response.vary.add(vary)
+    else:
+        response.cache_control.public = True
+    return response
+
+def not_modified_response(etag, last_modified=None, html=False, vary=None):
+    return set_validators(Response(status=304), etag, last_modified, html, vary)
+
+def has_pending_flashes():
+    # Flashed messages are only shown, and cleared, by rendering the page
+    return bool(session.get('_flashes'))
+
+# Full-page cache: whole responses for anonymous readers, so most page views skip MongoDB,
+# the renderer and Jinja. Keys carry a generation per post and one for the feed; invalidating
+# bumps the generation, so a render that was already running when a post changed is stored
+# under the old key and never served.
+class MemoryPageStore:
+    """In-process LRU of cached pages, bounded in bytes; each worker process has its own"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def _size(entry):
+        return len(entry['body'].encode('utf-8'))
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                self._bytes -= self._size(self._entries.pop(key)[1])
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl):
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._size(self._entries.pop(key)[1])
+            self._entries[key] = (time.time() + ttl, entry)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def add(self, key, ttl):
+        """Set key only if it is absent or expired; True if this call set it"""
+        now = time.time()
+        with self._lock:
+            if self._locks.get(key, 0) > now:
+                return False
+            if len(self._locks) >= 1024:
+                self._locks = {lock: until for lock, until in self._locks.items() if until > now}
+            self._locks[key] = now + ttl
+            return True
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+class RedisPageStore:
+    """Cached pages in Redis (or anything speaking its protocol), shared by every worker process"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value else None
+
+    def set(self, key, entry, ttl):
+        self.client.set(key, json.dumps(entry), ex=ttl)
+
+    def add(self, key, ttl):
+        return bool(self.client.set(key, 1, nx=True, ex=ttl))
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+class PageCache:
+    """Serves whole pages from a store, refreshing expired ones without a stampede
+
+    A page is fresh for ttl seconds and kept stale_seconds longer. The first request for an
+    expired page re-renders it while others keep getting the stale copy; requests for a page
+    that is not cached at all wait for one render in this process.
+    """
+
+    REFRESH_LOCK_SECONDS = 30
+
+    def __init__(self, store, ttl, stale_seconds):
+        self.store = store
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.fills = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def key(self, scope, variant=''):
+        prefix = f"page:{TEMPLATES_DIGEST}:{RENDERER_VERSION}"
+        return f"{prefix}:{scope}:{self.store.counter(f'{prefix}:gen:{scope}')}:{variant}"
+
+    def invalidate(self, scope):
+        prefix = f"page:{TEMPLATES_DIGEST}:{RENDERER_VERSION}"
+        self.store.incr(f'{prefix}:gen:{scope}')
+        self._count('invalidations')
+
+    def _entry(self, response):
+        if response.status_code != 200:
+            return None
+        etag, _ = response.get_etag()
+        return {
+            'body': response.get_data(as_text=True),
+            'mimetype': response.mimetype,
+            'etag': etag,
+            'last_modified': response.last_modified.isoformat() if response.last_modified else None,
+            'fresh_until': time.time() + self.ttl
+        }
+
+    def _fill(self, key, render, rendered):
+        rendered['response'] = render()
+        entry = self._entry(rendered['response'])
+        if entry:
+            try:
+                self.store.set(key, entry, self.ttl + self.stale_seconds)
+            except Exception as e:
+                print(f"Error writing page cache: {e}")
+                self._count('errors')
+        return entry
+
+    @staticmethod
+    def _respond(entry):
+        last_modified = datetime.fromisoformat(entry['last_modified']) if entry['last_modified'] else None
+        if not_modified(entry['etag'], last_modified):
+            return not_modified_response(entry['etag'], last_modified, html=True)
+        response = Response(entry['body'], mimetype=entry['mimetype'])
+        return set_validators(response, entry['etag'], last_modified, html=True)
+
+    def serve(self, scope, variant, render):
+        """Response for a page, from the cache or from render(), which must return a Response"""
+        try:
+            key = self.key(scope, variant)
+            entry = self.store.get(key)
+            if entry and entry['fresh_until'] > time.time():
+                self._count('hits')
+                return self._respond(entry)
+            if entry and not self.store.add(f'{key}:refresh', self.REFRESH_LOCK_SECONDS):
+                self._count('stale_hits')
+                return self._respond(entry)
+        except Exception as e:
+            print(f"Error reading page cache: {e}")
+            self._count('errors')
+            return render()
+        self._count('misses')
+        rendered = {}
+        entry = self.fills.do(key, self._fill, key, render, rendered)
+        # Only the caller that rendered has the response; others rebuild it from the entry
+        if 'response' in rendered:
+            return rendered['response']
+        return self._respond(entry) if entry else render()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'invalidations': self.invalidations,
+                'ttl': self.ttl,
+                'stale_seconds': self.stale_seconds
+            }
+        stats['fills'] = self.fills.stats()
+        stats['store'] = self.store.stats()
+        return stats
+
+def create_page_cache():
+    backend = app.config['PAGE_CACHE_BACKEND']
+    if backend == 'none':
+        return None
+    if backend == 'redis':
+        if redis is not None:
+            store = RedisPageStore(redis.Redis.from_url(app.config['PAGE_CACHE_REDIS_URL']))
+            return PageCache(store, app.config['PAGE_CACHE_TTL'], app.config['PAGE_CACHE_STALE_SECONDS'])
+        print("Warning: redis not installed. Falling back to the in-process page cache.")
+    store = MemoryPageStore(app.config['PAGE_CACHE_MAX_BYTES'])
+    return PageCache(store, app.config['PAGE_CACHE_TTL'], app.config['PAGE_CACHE_STALE_SECONDS'])
+
+page_cache = create_page_cache()
+
+def page_cached(scope_for):
+    """Cache a page for anonymous readers; scope_for(**view_args) returns (scope, variant)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if page_cache is None or current_user.is_authenticated or has_pending_flashes():
+                return f(*args, **kwargs)
+            scope, variant = scope_for(**kwargs)
+            return page_cache.serve(scope, variant, lambda: make_response(f(*args, **kwargs)))
+        return decorated
+    return decorator
+
+def invalidate_pages(*slugs):
+    """Drop cached pages of the given posts and of the feed after a write"""
+    if page_cache is None:
+        return
+    try:
+        for slug in slugs:
+            page_cache.invalidate(f'post:{slug}')
+        page_cache.invalidate('feed')
+    except Exception as e:
+        print(f"Error invalidating page cache: {e}")
+
 # Template context processor to provide datetime to all templates
 @app.context_processor
 def inject_datetime():
@@ -235,13 +2566,18 @@ def register():
             return render_template('auth/register.html')
 
         # Create new user
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            password_hash = password_hasher.generate_password_hash(password)
+        except HashPoolBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/register.html'), 429
         user_data = {
             'username': username,
             'email': email,
             'password_hash': password_hash,
             'created_at': datetime.now(timezone.utc),
-            'is_active': True
+            'is_active': True,
+            'post_count': 0
         }
         
         result = users_collection.insert_one(user_data)
@@ -264,7 +2600,12 @@ def login():
             return render_template('auth/login.html')
 
         user = User.get_by_username(username)
-        if user and bcrypt.check_password_hash(user.password_hash, password):
+        try:
+            password_ok = bool(user) and password_hasher.check_password_hash(user.password_hash, password)
+        except HashPoolBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/login.html'), 429
+        if password_ok:
             login_user(user, remember=remember)
             next_page = request.args.get('next')
             flash('Login successful!', 'success')
@@ -300,20 +2641,18 @@ def forgot_password():
             # Send reset email
             if app.config['MAIL_USERNAME']:
                 try:
-                    msg = Message(
-                        'Password Reset Request - Duffin\'s Blog',
-                        sender=app.config['MAIL_USERNAME'],
-                        recipients=[email]
-                    )
                     reset_url = url_for('reset_password', token=token, _external=True)
-                    msg.body = f'''To reset your password, visit the following link:
+                    email_outbox.enqueue(
+                        'Password Reset Request - Duffin\'s Blog',
+                        [email],
+                        f'''To reset your password, visit the following link:
 {reset_url}
 
 If you did not make this request, simply ignore this email and no changes will be made.
 
 This link will expire in 1 hour.
 '''
-                    mail.send(msg)
+                    )
                     flash('A password reset email has been sent.', 'info')
                 except Exception as e:
                     flash('Error sending email. Please try again later.', 'error')
@@ -353,11 +2692,17 @@ def reset_password(token):
             return render_template('auth/reset_password.html', token=token)
         
         # Update password
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            password_hash = password_hasher.generate_password_hash(password)
+        except HashPoolBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/reset_password.html', token=token), 429
         users_collection.update_one(
             {'_id': reset_token['user_id']},
             {'$set': {'password_hash': password_hash}}
         )
+        User.invalidate(reset_token['user_id'])
+        token_revocations.revoke_user(reset_token['user_id'])
         
         # Delete the reset token
         reset_tokens_collection.delete_one({'_id': reset_token['_id']})
@@ -368,56 +2713,203 @@ def reset_password(token):
     return render_template('auth/reset_password.html', token=token)
 
 # Blog Routes
-@app.route('/')
-def index():
-    posts = list(posts_collection.find().sort('timestamp', -1))
+def render_feed(tag=None, author=None):
+    """The home page, or the feed of the posts carrying a tag or written by an author (a user document)"""
+    if tag:
+        query, feed_url = {'tags': tag}, url_for('tag_feed', name=tag)
+    elif author:
+        query, feed_url = {'author_id': author['_id']}, url_for('author_feed', username=author['username'])
+    else:
+        query, feed_url = None, url_for('index')
+    limit = get_page_limit(request.args.get('limit', type=int))
+    cursor = request.args.get('cursor')
+    try:
+        versions, next_cursor = fetch_posts_page(query, limit=limit, cursor=cursor, fields=VERSION_FIELDS)
+    except ValueError:
+        return redirect(feed_url)
+    tag_cloud = top_tags()
+    cloud_version = [(entry['name'], entry['count']) for entry in tag_cloud]
+    if author:
+        cloud_version.append((author['username'], author.get('post_count')))
+    etag = make_etag('index', tag, request.query_string, next_cursor, cloud_version,
+                     *[post_version(post) for post in versions], *page_etag_parts())
+    if not has_pending_flashes() and not_modified(etag):
+        return not_modified_response(etag, html=True)
+
+    posts, next_cursor = fetch_posts_page(query, limit=limit, cursor=cursor, fields=INDEX_FIELDS)
     for post in posts:
-        post['parsed_content'] = parse_content_for_display(post.get('content', ''))
+        ensure_rendered(post)
         if 'title' not in post or not post['title']:
             post['title'] = "Untitled Post"
         if 'slug' not in post or not post['slug']:
             post['slug'] = slugify(post['title']) if post['title'] else f"untitled-post-{post['_id']}"
-    return render_template('index.html', posts=posts, now=datetime.now(timezone.utc))
+    etag = make_etag('index', tag, request.query_string, next_cursor, cloud_version,
+                     *[post_version(post) for post in posts], *page_etag_parts())
+    response = make_response(render_template('index.html', posts=posts, next_cursor=next_cursor, limit=limit, tag=tag,
+                                             author=author, tag_cloud=tag_cloud,
+                                             now=datetime.now(timezone.utc)))
+    return set_validators(response, etag, html=True)
+
+@app.route('/')
+@page_cached(lambda: ('feed', request.query_string.decode('utf-8', 'replace')))
+def index():
+    return render_feed()
+
+@app.route('/tag/<path:name>')
+@page_cached(lambda name: ('feed', f"tag:{name}?{request.query_string.decode('utf-8', 'replace')}"))
+def tag_feed(name):
+    return render_feed(tag=name)
+
+@app.route('/author/<username>')
+@page_cached(lambda username: ('feed', f"author:{username}?{request.query_string.decode('utf-8', 'replace')}"))
+def author_feed(username):
+    author = users_collection.find_one({'username': username}, {'username': 1, 'post_count': 1, 'created_at': 1})
+    if not author:
+        return "Author not found", 404
+    return render_feed(author=author)
 
 @app.route('/post/<slug>')
+@page_cached(lambda slug: (f'post:{slug}', ''))
 def view_post(slug):
-    post = posts_collection.find_one({"slug": slug})
+    version = posts_collection.find_one({"slug": slug}, projection(VERSION_FIELDS))
+    if not version:
+        return "Post not found", 404
+    etag = make_etag('post', post_version(version), *page_etag_parts())
+    if not has_pending_flashes() and not_modified(etag, version.get('last_updated')):
+        return not_modified_response(etag, version.get('last_updated'), html=True)
+
+    post = posts_collection.find_one({"slug": slug}, projection(VIEW_FIELDS))
     if not post:
         return "Post not found", 404
-    post['parsed_content'] = parse_content_for_display(post.get('content', ''))
+    ensure_rendered(post)
+    etag = make_etag('post', post_version(post), *page_etag_parts())
     post_tags = post.get('tags', [])
     
     # Check if AI service is available and content exists
     ai_available = bool(gemini_model and post.get('content') and len(post.get('content', '').strip()) >= 5)
     
-    return render_template('view_post.html', post=post, post_tags=post_tags, ai_available=ai_available, now=datetime.now(timezone.utc))
+    response = make_response(render_template('view_post.html', post=post, post_tags=post_tags, ai_available=ai_available, now=datetime.now(timezone.utc)))
+    return set_validators(response, etag, post.get('last_updated'), html=True)
+
+@app.route('/search')
+def search():
+    query = request.args.get('q', '').strip()[:MAX_SEARCH_QUERY_LENGTH]
+    page = max(1, request.args.get('page', 1, type=int))
+    limit = get_page_limit(request.args.get('limit', type=int))
+    results, has_next = [], False
+    if query:
+        try:
+            posts, has_next = search_posts(query, page, limit, INDEX_FIELDS + ['parsed_content'])
+        except PyMongoError as e:
+            print(f"Error searching posts for {query!r}: {e}")
+            flash('Search is unavailable right now. Please try again later.', 'error')
+            posts = []
+        terms = search_terms(query)
+        for post in posts:
+            ensure_rendered(post)
+            results.append({'post': post, 'highlights': highlight_post(post, terms)})
+    return render_template('search.html', query=query, results=results, page=page, has_next=has_next, limit=limit)
 
 @app.route('/api/generate-summary/<slug>')
 def generate_summary_api(slug):
     """API endpoint to generate AI summary for a post"""
     try:
-        post = posts_collection.find_one({"slug": slug})
+        post = posts_collection.find_one({"slug": slug}, projection(['title', 'content', 'ai_summary', 'ai_summary_key']))
         if not post:
             return jsonify({'error': 'Post not found'}), 404
         
+        stored_summary = get_stored_summary(post)
+        if stored_summary:
+            return jsonify({'summary': stored_summary, 'cached': True})
+        
         if not gemini_model:
             return jsonify({'error': 'AI service not available'}), 503
         
         content = post.get('content', '')
         if len(content.strip()) < 5:
             return jsonify({'error': 'Content too short for summary'}), 400
-            
-        ai_summary = generate_ai_summary(content, post.get('title', ''))
         
-        if ai_summary:
-            return jsonify({'summary': ai_summary})
-        else:
+        # Asking again for a revision whose summary was overwritten after its job finished, or
+        # that failed every retry longer than the cooldown ago, starts it over; a reader waiting
+        # on it moves it ahead of summaries pre-warmed on save
+        job = summary_queue.enqueue(post['_id'], post.get('title', ''), content, rerun=True, priority=5)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_SUMMARY_WAIT_SECONDS)
+        if wait and job['status'] in ('pending', 'running'):
+            job = summary_queue.wait(job['_id'], wait)
+        
+        if job['status'] == 'done':
+            post = posts_collection.find_one({"_id": post['_id']}, projection(['title', 'content', 'ai_summary', 'ai_summary_key']))
+            stored_summary = get_stored_summary(post)
+            if stored_summary:
+                return jsonify({'summary': stored_summary, 'cached': False})
+        elif job['status'] == 'failed':
             return jsonify({'error': 'Failed to generate summary'}), 500
+        
+        return jsonify({'status': 'pending'}), 202
             
     except Exception as e:
         print(f"Error in generate_summary_api: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/generate-summary/<slug>/stream')
+def stream_summary_api(slug):
+    """Server-sent events variant of generate_summary_api: `token` events as Gemini produces text, then `done`"""
+    post = posts_collection.find_one({"slug": slug}, projection(['title', 'content', 'ai_summary', 'ai_summary_key']))
+    if not post:
+        return jsonify({'error': 'Post not found'}), 404
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    stored_summary = get_stored_summary(post)
+    if stored_summary:
+        return Response(sse_event('done', {'summary': stored_summary, 'cached': True}), mimetype='text/event-stream', headers=headers)
+    
+    if not gemini_model:
+        return jsonify({'error': 'AI service not available'}), 503
+    
+    title = post.get('title', '')
+    content = post.get('content', '')
+    if len(content.strip()) < 5:
+        return jsonify({'error': 'Content too short for summary'}), 400
+    
+    # Generation runs on its own thread so it still finishes and is stored if the reader goes away.
+    # Readers that join a generation already in flight get the whole summary in the `done` event.
+    key = summary_cache_key(title, content)
+    chunks = queue.Queue()
+    
+    def generate():
+        summary = None
+        try:
+            summary = summary_queue.generations.do(key, stream_ai_summary, content, title, chunks.put)
+            if summary:
+                store_summary(post['_id'], key, summary)
+        except Exception as e:
+            print(f"Error in stream_summary_api: {e}")
+        finally:
+            chunks.put(SimpleNamespace(summary=summary))
+    
+    threading.Thread(target=generate, name=f"summary-stream-{slug}", daemon=True).start()
+    
+    def events():
+        while True:
+            try:
+                item = chunks.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if isinstance(item, str):
+                yield sse_event('token', {'text': item})
+            elif item.summary:
+                yield sse_event('done', {'summary': item.summary, 'cached': False})
+                return
+            else:
+                yield sse_event('failed', {'error': 'Failed to generate summary'})
+                return
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+
 @app.route('/create', methods=['GET', 'POST'])
 @login_required
 def create_post_page():
@@ -431,18 +2923,12 @@ def create_post_page():
             flash('Title is required.', 'error')
             return render_template('create_post.html', is_edit=False, title=title, content=content, tags=",".join(tags))
 
-        post_slug = slugify(title)
-        original_slug = post_slug
-        counter = 1
-        while posts_collection.find_one({"slug": post_slug}):
-            post_slug = f"{original_slug}-{counter}"
-            counter += 1
+        post_slug = allocate_slug(title)
         
         hero_banner_url = None
         if hero_banner_file and allowed_file(hero_banner_file.filename):
-            filename = secure_filename(f"{post_slug}-hero-{hero_banner_file.filename}")
-            hero_banner_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            hero_banner_url = url_for('static', filename=f'uploads/{filename}')
+            hero_banner_name = save_upload(hero_banner_file)
+            hero_banner_url = upload_url(hero_banner_name)
 
         post_data = {
             'title': title,
@@ -450,21 +2936,30 @@ def create_post_page():
             'content': content,
             'tags': tags,
             'hero_banner_url': hero_banner_url,
+            'upload_refs': upload_refs(content, hero_banner_url),
             'author_id': ObjectId(current_user.id),
             'author_username': current_user.username,
             'timestamp': datetime.now(timezone.utc),
             'last_updated': datetime.now(timezone.utc)
         }
-        posts_collection.insert_one(post_data)
+        post_data.update(render_post_fields(content))
+        result = insert_post(post_data)
+        change_upload_refs([], post_data['upload_refs'])
+        change_tag_counts([], tags)
+        change_post_count(current_user.id, 1)
+        enqueue_summary(result.inserted_id, title, content)
+        if hero_banner_url:
+            apply_upload_variants(result.inserted_id, hero_banner_name)
+        invalidate_pages()
         flash('Post created successfully!', 'success')
-        return redirect(url_for('view_post', slug=post_slug))
+        return redirect(url_for('view_post', slug=post_data['slug']))
 
     return render_template('create_post.html', is_edit=False)
 
 @app.route('/edit/<slug>', methods=['GET', 'POST'])
 @login_required
 def edit_post_page(slug):
-    post = posts_collection.find_one({"slug": slug})
+    post = posts_collection.find_one({"slug": slug}, projection(EDIT_FIELDS))
     if not post:
         return "Post not found", 404
 
@@ -484,7 +2979,7 @@ def edit_post_page(slug):
             return render_template('create_post.html', post=post, is_edit=True, title=title, content=content, tags=",".join(tags))
 
         new_slug = slugify(title)
-        if new_slug != slug and posts_collection.find_one({"slug": new_slug}):
+        if new_slug != slug and posts_collection.find_one({"slug": new_slug}, {'_id': 1}):
             flash('A post with this title already exists.', 'error')
             return render_template('create_post.html', post=post, is_edit=True, title=title, content=content, tags=",".join(tags))
         
@@ -494,17 +2989,29 @@ def edit_post_page(slug):
             'tags': tags,
             'last_updated': datetime.now(timezone.utc)
         }
+        update_data.update(render_post_fields(content))
         if new_slug != slug:
             update_data['slug'] = new_slug
+        if content != post.get('content'):
+            render_cache.invalidate(post.get('content'))
         
+        hero_banner_name = None
         if hero_banner_file and allowed_file(hero_banner_file.filename):
-            filename = secure_filename(f"{new_slug}-hero-{hero_banner_file.filename}")
-            hero_banner_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            update_data['hero_banner_url'] = url_for('static', filename=f'uploads/{filename}')
+            hero_banner_name = save_upload(hero_banner_file)
+            update_data['hero_banner_url'] = upload_url(hero_banner_name)
+            update_data['hero_banner_variants'] = None
         elif request.form.get('remove_hero_banner'):
             update_data['hero_banner_url'] = None
+            update_data['hero_banner_variants'] = None
+        update_data['upload_refs'] = upload_refs(content, update_data.get('hero_banner_url', post.get('hero_banner_url')))
 
         posts_collection.update_one({"_id": post['_id']}, {"$set": update_data})
+        change_upload_refs(post.get('upload_refs'), update_data['upload_refs'])
+        change_tag_counts(post.get('tags'), tags)
+        enqueue_summary(post['_id'], title, content)
+        if hero_banner_name:
+            apply_upload_variants(post['_id'], hero_banner_name)
+        invalidate_pages(slug, update_data.get('slug', slug))
         flash('Post updated successfully!', 'success')
         return redirect(url_for('view_post', slug=update_data.get('slug', slug)))
 
@@ -519,16 +3026,14 @@ def upload_image_for_editor():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        file_url = url_for('static', filename=f'uploads/{filename}')
-        return jsonify({"url": file_url})
+        # The file behind this URL is downsized and stripped of metadata shortly after
+        return jsonify({"url": upload_url(save_upload(file))})
     return jsonify({"error": "File type not allowed"}), 400
 
 @app.route('/post/<slug>/delete', methods=['POST'])
 @login_required
 def delete_post(slug):
-    post = posts_collection.find_one({"slug": slug})
+    post = posts_collection.find_one({"slug": slug}, projection(['author_id', 'content', 'hero_banner_url', 'upload_refs', 'tags']))
     if not post:
         return "Post not found", 404
     
@@ -538,15 +3043,18 @@ def delete_post(slug):
         return redirect(url_for('view_post', slug=slug))
     
     posts_collection.delete_one({"_id": post['_id']})
+    render_cache.invalidate(post.get('content'))
+    invalidate_pages(slug)
     
-    # Clean up associated files
-    if post.get('hero_banner_url'):
-        try:
-            hero_banner_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(post['hero_banner_url']))
-            if os.path.exists(hero_banner_path):
-                os.remove(hero_banner_path)
-        except Exception as e:
-            print(f"Error deleting hero banner for {slug}: {e}")
+    # Clean up associated files; stored uploads are removed once no other post uses them
+    try:
+        change_post_count(post['author_id'], -1)
+        change_tag_counts(post.get('tags'), [])
+        change_upload_refs(post.get('upload_refs'), [])
+        if post.get('hero_banner_url') and not upload_refs(post['hero_banner_url']):
+            job_runner.enqueue('delete_upload', {'filename': os.path.basename(post['hero_banner_url'])})
+    except PyMongoError as e:
+        print(f"Error releasing uploads of {slug}: {e}")
     
     flash('Post deleted successfully!', 'success')
     return redirect(url_for('index'))
@@ -560,20 +3068,42 @@ def test_email():
         return redirect(url_for('index'))
     
     try:
-        msg = Message(
+        email_outbox.enqueue(
             'Test Email - Duffin\'s Blog',
-            sender=app.config['MAIL_USERNAME'],
-            recipients=[current_user.email]
+            [current_user.email],
+            'This is a test email to verify your email configuration is working correctly.'
         )
-        msg.body = 'This is a test email to verify your email configuration is working correctly.'
-        mail.send(msg)
-        flash('Test email sent successfully!', 'success')
+        flash('Test email queued for delivery! Delivery status is under "email" in /api/metrics.', 'success')
     except Exception as e:
         flash(f'Error sending test email: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
 # API Routes
+METRICS_JOB_COUNT_SECONDS = 10
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """In-process cache and worker counters for monitoring"""
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        return jsonify({'message': 'Metrics are disabled: set METRICS_TOKEN'}), 404
+    if not secrets.compare_digest(request.headers.get('Authorization', '').encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        return jsonify({'message': 'Token is invalid!'}), 401
+    return jsonify({
+        'render_cache': render_cache.stats(),
+        'user_cache': user_cache.stats(),
+        'password_hashing': password_hasher.stats(),
+        'summary_coalescing': {
+            'generations': summary_queue.generations.stats(),
+            'lookups': summary_queue.lookups.stats()
+        },
+        # Counting jobs scans the whole collection, so scrapes share one count for a few seconds
+        'jobs': job_runner.stats(max_age=METRICS_JOB_COUNT_SECONDS),
+        'smtp': email_outbox.pool.stats(),
+        'page_cache': page_cache.stats() if page_cache else None
+    }), 200
+
 @app.route('/api/login', methods=['POST'])
 def api_login():
     try:
@@ -585,15 +3115,9 @@ def api_login():
             return jsonify({'message': 'Username and password are required'}), 400
 
         user = User.get_by_username(username)
-        if user and bcrypt.check_password_hash(user.password_hash, password):
-            token = jwt.encode({
-                'user_id': user.id,
-                'username': user.username,
-                'exp': datetime.utcnow() + timedelta(days=7)
-            }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-            
+        if user and password_hasher.check_password_hash(user.password_hash, password):
             return jsonify({
-                'token': token,
+                **issue_tokens(user),
                 'user': {
                     'id': user.id,
                     'username': user.username,
@@ -602,6 +3126,8 @@ def api_login():
             }), 200
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
+    except HashPoolBusy:
+        return jsonify({'message': 'Server is busy, please retry'}), 429, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': 'Login failed', 'error': str(e)}), 500
 
@@ -625,70 +3151,207 @@ def api_register():
         if User.get_by_email(email):
             return jsonify({'message': 'Email already registered'}), 400
 
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        password_hash = password_hasher.generate_password_hash(password)
         user_data = {
             'username': username,
             'email': email,
             'password_hash': password_hash,
             'created_at': datetime.now(timezone.utc),
-            'is_active': True
+            'is_active': True,
+            'post_count': 0
         }
         
         result = users_collection.insert_one(user_data)
         user = User.get(result.inserted_id)
         
-        token = jwt.encode({
-            'user_id': user.id,
-            'username': user.username,
-            'exp': datetime.utcnow() + timedelta(days=7)
-        }, app.config['JWT_SECRET_KEY'], algorithm='HS256')
-        
         return jsonify({
-            'token': token,
+            **issue_tokens(user),
             'user': {
                 'id': user.id,
                 'username': user.username,
                 'email': user.email
             }
         }), 201
+    except HashPoolBusy:
+        return jsonify({'message': 'Server is busy, please retry'}), 429, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
+@app.route('/api/token/refresh', methods=['POST'])
+def api_refresh_token():
+    """Exchange a refresh token for a new access/refresh pair; the old refresh token stops working"""
+    try:
+        data = request.get_json() or {}
+        refresh_token = data.get('refresh_token')
+        if not refresh_token:
+            return jsonify({'message': 'Refresh token is required'}), 400
+
+        try:
+            claims = jwt.decode(refresh_token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'message': 'Refresh token has expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'message': 'Refresh token is invalid'}), 401
+
+        # Refresh tokens issued before families existed have none and must log in again
+        if claims.get('type') != 'refresh' or not claims.get('family') or token_revocations.is_revoked(claims):
+            return jsonify({'message': 'Refresh token is invalid'}), 401
+
+        # Refreshing is the point where a deleted or deactivated account is noticed
+        user = User.get(claims['user_id'])
+        if not user or not user.is_active():
+            return jsonify({'message': 'Refresh token is invalid'}), 401
+
+        refresh_jti = rotate_refresh_token(claims)
+        if not refresh_jti:
+            return jsonify({'message': 'Refresh token is invalid'}), 401
+        return jsonify(issue_tokens(user, claims['family'], refresh_jti)), 200
+    except Exception as e:
+        return jsonify({'message': 'Token refresh failed', 'error': str(e)}), 500
+
+@app.route('/api/logout', methods=['POST'])
+def api_logout():
+    """Revoke the presented access token and, if given, end the refresh token's session"""
+    try:
+        data = request.get_json(silent=True) or {}
+        tokens = [data.get('refresh_token')]
+        authorization = request.headers.get('Authorization', '')
+        tokens.append(authorization[7:] if authorization.startswith('Bearer ') else authorization)
+        for token in filter(None, tokens):
+            try:
+                claims = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            except jwt.InvalidTokenError:
+                continue
+            if claims.get('type') == 'refresh':
+                end_refresh_family(claims)
+            else:
+                token_revocations.revoke_token(claims)
+        return jsonify({'message': 'Logged out'}), 200
+    except Exception as e:
+        return jsonify({'message': 'Logout failed', 'error': str(e)}), 500
+
+def api_feed_response(query=None, extra=None, vary=None):
+    """One page of a JSON feed of the posts matching query, with extra keys added to the body"""
+    limit = get_page_limit(request.args.get('limit', type=int))
+    try:
+        fields = get_api_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    cursor = request.args.get('cursor')
+    extra = extra or {}
+    try:
+        versions, next_cursor = fetch_posts_page(query, limit=limit, cursor=cursor, fields=VERSION_FIELDS)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    etag = make_etag('api_posts', request.path, request.query_string, next_cursor, json.dumps(extra, sort_keys=True),
+                     *[post_version(post) for post in versions])
+    if not_modified(etag):
+        return not_modified_response(etag, vary=vary)
+
+    posts, next_cursor = fetch_posts_page(query, limit=limit, cursor=cursor, fields=api_read_fields(fields) + VERSION_FIELDS)
+    if 'parsed_content' in fields or 'excerpt' in fields:
+        for post in posts:
+            ensure_rendered(post)
+    etag = make_etag('api_posts', request.path, request.query_string, next_cursor, json.dumps(extra, sort_keys=True),
+                     *[post_version(post) for post in posts])
+    response = jsonify({**extra, 'posts': [serialize_post(post, fields) for post in posts], 'next_cursor': next_cursor})
+    return set_validators(response, etag, vary=vary), 200
+
 @app.route('/api/posts', methods=['GET'])
 def api_get_posts():
     try:
-        posts = list(posts_collection.find().sort('timestamp', -1))
-        for post in posts:
-            post['_id'] = str(post['_id'])
-            post['author_id'] = str(post.get('author_id', ''))
-            post['parsed_content'] = parse_content_for_display(post.get('content', ''))
-            if 'timestamp' in post:
-                post['timestamp'] = post['timestamp'].isoformat()
-            if 'last_updated' in post:
-                post['last_updated'] = post['last_updated'].isoformat()
-        return jsonify({'posts': posts}), 200
+        tag = request.args.get('tag')
+        return api_feed_response({'tags': tag} if tag else None)
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch posts', 'error': str(e)}), 500
+
+@app.route('/api/me/posts', methods=['GET'])
+@token_required(stateless=True)
+def api_get_my_posts(current_user_obj):
+    """The caller's own posts; read-only, so in stateless mode the token's claims are trusted"""
+    try:
+        user = {'id': current_user_obj.id, 'username': current_user_obj.username}
+        return api_feed_response({'author_id': ObjectId(current_user_obj.id)}, extra={'user': user}, vary='Authorization')
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch posts', 'error': str(e)}), 500
+
+@app.route('/api/users/<user_id>/posts', methods=['GET'])
+def api_get_user_posts(user_id):
+    try:
+        if not ObjectId.is_valid(user_id):
+            return jsonify({'message': 'Invalid user id'}), 400
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, {'username': 1, 'post_count': 1})
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        author = {'id': str(user['_id']), 'username': user['username'], 'post_count': user.get('post_count', 0)}
+        return api_feed_response({'author_id': user['_id']}, {'user': author})
     except Exception as e:
         return jsonify({'message': 'Failed to fetch posts', 'error': str(e)}), 500
 
 @app.route('/api/posts/<slug>', methods=['GET'])
 def api_get_post(slug):
     try:
-        post = posts_collection.find_one({"slug": slug})
+        try:
+            fields = get_api_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        version = posts_collection.find_one({"slug": slug}, projection(VERSION_FIELDS))
+        if not version:
+            return jsonify({'message': 'Post not found'}), 404
+        etag = make_etag('api_post', request.query_string, post_version(version))
+        if not_modified(etag, version.get('last_updated')):
+            return not_modified_response(etag, version.get('last_updated'))
+
+        post = posts_collection.find_one({"slug": slug}, projection(api_read_fields(fields) + VERSION_FIELDS))
         if not post:
             return jsonify({'message': 'Post not found'}), 404
         
-        post['_id'] = str(post['_id'])
-        post['author_id'] = str(post.get('author_id', ''))
-        post['parsed_content'] = parse_content_for_display(post.get('content', ''))
-        if 'timestamp' in post:
-            post['timestamp'] = post['timestamp'].isoformat()
-        if 'last_updated' in post:
-            post['last_updated'] = post['last_updated'].isoformat()
+        if 'parsed_content' in fields or 'excerpt' in fields:
+            ensure_rendered(post)
+        etag = make_etag('api_post', request.query_string, post_version(post))
         
-        return jsonify({'post': post}), 200
+        return set_validators(jsonify({'post': serialize_post(post, fields)}), etag, post.get('last_updated')), 200
     except Exception as e:
         return jsonify({'message': 'Failed to fetch post', 'error': str(e)}), 500
 
+@app.route('/api/tags', methods=['GET'])
+def api_get_tags():
+    try:
+        limit = get_page_limit(request.args.get('limit', type=int) or TAG_CLOUD_SIZE)
+        return jsonify({'tags': top_tags(limit)}), 200
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch tags', 'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'message': 'Query parameter q is required'}), 400
+        if len(query) > MAX_SEARCH_QUERY_LENGTH:
+            return jsonify({'message': f'Query must be at most {MAX_SEARCH_QUERY_LENGTH} characters'}), 400
+        page = max(1, request.args.get('page', 1, type=int))
+        limit = get_page_limit(request.args.get('limit', type=int))
+        try:
+            fields = get_api_fields(request.args.get('fields') or 'title,slug,excerpt,author_username,timestamp,tags,hero_banner_url')
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        posts, has_next = search_posts(query, page, limit, api_read_fields(fields) + ['title', 'parsed_content', 'renderer_version'])
+        terms = search_terms(query)
+        results = []
+        for post in posts:
+            ensure_rendered(post)
+            highlights = highlight_post(post, terms)
+            results.append({
+                **serialize_post(post, fields),
+                'score': round(post['score'], 4),
+                'highlights': {name: str(html) for name, html in highlights.items()}
+            })
+        return jsonify({'results': results, 'page': page, 'next_page': page + 1 if has_next else None}), 200
+    except Exception as e:
+        return jsonify({'message': 'Search failed', 'error': str(e)}), 500
+
 @app.route('/api/posts', methods=['POST'])
 @token_required
 def api_create_post(current_user_obj):
@@ -701,31 +3364,30 @@ def api_create_post(current_user_obj):
         if not title:
             return jsonify({'message': 'Title is required'}), 400
 
-        post_slug = slugify(title)
-        original_slug = post_slug
-        counter = 1
-        while posts_collection.find_one({"slug": post_slug}):
-            post_slug = f"{original_slug}-{counter}"
-            counter += 1
+        post_slug = allocate_slug(title)
 
         post_data = {
             'title': title,
             'slug': post_slug,
             'content': content,
             'tags': tags if isinstance(tags, list) else [],
+            'upload_refs': upload_refs(content),
             'author_id': ObjectId(current_user_obj.id),
             'author_username': current_user_obj.username,
             'timestamp': datetime.now(timezone.utc),
             'last_updated': datetime.now(timezone.utc)
         }
+        post_data.update(render_post_fields(content))
         
-        result = posts_collection.insert_one(post_data)
-        post_data['_id'] = str(result.inserted_id)
-        post_data['author_id'] = str(post_data['author_id'])
-        post_data['timestamp'] = post_data['timestamp'].isoformat()
-        post_data['last_updated'] = post_data['last_updated'].isoformat()
+        result = insert_post(post_data)
+        change_upload_refs([], post_data['upload_refs'])
+        change_tag_counts([], post_data['tags'])
+        change_post_count(current_user_obj.id, 1)
+        enqueue_summary(result.inserted_id, title, content)
+        invalidate_pages()
+        post_data['_id'] = result.inserted_id
         
-        return jsonify({'post': post_data}), 201
+        return jsonify({'post': serialize_post(post_data, API_POST_FIELDS)}), 201
     except Exception as e:
         return jsonify({'message': 'Failed to create post', 'error': str(e)}), 500
 
@@ -733,7 +3395,7 @@ def api_create_post(current_user_obj):
 @token_required
 def api_update_post(current_user_obj, slug):
     try:
-        post = posts_collection.find_one({"slug": slug})
+        post = posts_collection.find_one({"slug": slug}, projection(['author_id', 'content', 'hero_banner_url', 'upload_refs', 'tags']))
         if not post:
             return jsonify({'message': 'Post not found'}), 404
 
@@ -749,27 +3411,31 @@ def api_update_post(current_user_obj, slug):
             return jsonify({'message': 'Title is required'}), 400
 
         new_slug = slugify(title)
-        if new_slug != slug and posts_collection.find_one({"slug": new_slug}):
+        if new_slug != slug and posts_collection.find_one({"slug": new_slug}, {'_id': 1}):
             return jsonify({'message': 'A post with this title already exists'}), 400
 
         update_data = {
             'title': title,
             'content': content,
             'tags': tags if isinstance(tags, list) else [],
+            'upload_refs': upload_refs(content, post.get('hero_banner_url')),
             'last_updated': datetime.now(timezone.utc)
         }
+        update_data.update(render_post_fields(content))
         if new_slug != slug:
             update_data['slug'] = new_slug
+        if content != post.get('content'):
+            render_cache.invalidate(post.get('content'))
 
         posts_collection.update_one({"_id": post['_id']}, {"$set": update_data})
+        change_upload_refs(post.get('upload_refs'), update_data['upload_refs'])
+        change_tag_counts(post.get('tags'), update_data['tags'])
+        enqueue_summary(post['_id'], title, content)
+        invalidate_pages(slug, update_data.get('slug', slug))
         
-        updated_post = posts_collection.find_one({"_id": post['_id']})
-        updated_post['_id'] = str(updated_post['_id'])
-        updated_post['author_id'] = str(updated_post.get('author_id', ''))
-        updated_post['timestamp'] = updated_post['timestamp'].isoformat()
-        updated_post['last_updated'] = updated_post['last_updated'].isoformat()
+        updated_post = posts_collection.find_one({"_id": post['_id']}, projection(API_POST_FIELDS))
         
-        return jsonify({'post': updated_post}), 200
+        return jsonify({'post': serialize_post(updated_post, API_POST_FIELDS)}), 200
     except Exception as e:
         return jsonify({'message': 'Failed to update post', 'error': str(e)}), 500
 
@@ -777,7 +3443,7 @@ def api_update_post(current_user_obj, slug):
 @token_required
 def api_delete_post(current_user_obj, slug):
     try:
-        post = posts_collection.find_one({"slug": slug})
+        post = posts_collection.find_one({"slug": slug}, projection(['author_id', 'content', 'upload_refs', 'tags']))
         if not post:
             return jsonify({'message': 'Post not found'}), 404
 
@@ -785,6 +3451,11 @@ def api_delete_post(current_user_obj, slug):
             return jsonify({'message': 'You can only delete your own posts'}), 403
 
         posts_collection.delete_one({"_id": post['_id']})
+        render_cache.invalidate(post.get('content'))
+        invalidate_pages(slug)
+        change_post_count(post['author_id'], -1)
+        change_tag_counts(post.get('tags'), [])
+        change_upload_refs(post.get('upload_refs'), [])
         return jsonify({'message': 'Post deleted successfully'}), 200
     except Exception as e:
         return jsonify({'message': 'Failed to delete post', 'error': str(e)}), 500
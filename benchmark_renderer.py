@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Compare render_markdown() with the old chained re.sub renderer.
+
+Checks that both produce identical HTML for every supported construct, then
+times them on 1 KB, 100 KB and 5 MB inputs, and checks that inputs which made
+the old patterns backtrack still render in linear time.
+
+    python3 benchmark_renderer.py
+"""
+
+import os
+import re
+import sys
+import time
+import timeit
+
+# app.py refuses to import without MONGO_URI; the client connects lazily and
+# index checks are skipped, so no database is needed here
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/duffins_blog')
+os.environ.setdefault('ENSURE_INDEXES_ON_STARTUP', 'False')
+
+from app import render_markdown
+
+
+def legacy_parse_content_for_display(content):
+    """The renderer as it was before the single-pass tokenizer"""
+    content = re.sub(r'(?<!<img src=")\!\[(.*?)\]\((.*?)\)(?!">)', r'<img src="\2" alt="\1" class="img-fluid mb-2">', content)
+    content = re.sub(r'\[(.*?)\]\((http[s]?://.*?)\)', r'<a href="\2" target="_blank" rel="noopener noreferrer">\1</a>', content)
+    content = re.sub(r'\[youtube\]\((?:https?://)?(?:www\.)?(?:youtube\.com/watch\?v=|youtu\.be/)?([a-zA-Z0-9_-]{11})\)', r'<div class="embed-responsive embed-responsive-16by9 mb-2"><iframe class="embed-responsive-item" src="https://www.youtube.com/embed/\1" allowfullscreen></iframe></div>', content)
+    content = re.sub(r'\[embed\]\((http[s]?://.*?)\)', r'<div class="embed-responsive embed-responsive-16by9 mb-2"><iframe class="embed-responsive-item" src="\1" allowfullscreen></iframe></div>', content)
+    content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', content)
+    content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', content)
+    content = re.sub(r'~~(.*?)~~', r'<del>\1</del>', content)
+    content = re.sub(r'`(.*?)`', r'<code>\1</code>', content)
+    content = re.sub(r'^### (.*$)', r'<h3>\1</h3>', content, flags=re.MULTILINE)
+    content = re.sub(r'^## (.*$)', r'<h2>\1</h2>', content, flags=re.MULTILINE)
+    content = re.sub(r'^> (.*$)', r'<blockquote>\1</blockquote>', content, flags=re.MULTILINE)
+    content = re.sub(r'^- (.*$)', r'<li>\1</li>', content, flags=re.MULTILINE)
+    if not any(tag in content for tag in ['<pre', '<div', '<p']):
+        content = content.replace('\n', '<br>')
+    return content
+
+
+# One sample per construct, plus the nesting that shows up in real posts.
+# Delimiters that cross each other (e.g. `*a **b* c**`) are not covered: the
+# chained passes turned those into mis-nested tags, the tokenizer matches the
+# leftmost construct instead.
+PARITY_SAMPLES = [
+    'Plain text\nwith two lines',
+    '![a cat](/static/uploads/cat.jpg)',
+    'See [the docs](https://example.com/docs) for more.',
+    '[![banner](/static/uploads/b.png)](https://example.com)',
+    '[youtube](dQw4w9WgXcQ)',
+    '[youtube](youtube.com/watch?v=dQw4w9WgXcQ)',
+    '[youtube](https://youtu.be/dQw4w9WgXcQ)',
+    '[embed](https://example.com/widget)',
+    'Some **bold** and *italic* and ~~struck~~ and `code`.',
+    '*italic with **bold** inside*',
+    '**bold with *italic* inside**',
+    '~~struck **bold**~~ and `**code**`',
+    '*a **b**',
+    '[**bold link**](http://example.com/path)',
+    '### Heading three\n## Heading two\n> A *quoted* line\n- item one\n- item **two**',
+    '## Title\r\n\r\nBody with CRLF\r\n- list\r\n',
+    '<p>Raw HTML keeps its newlines</p>\nsecond line',
+    '<div>embedded</div>\n**still bold**',
+    '#### not a header\n-not a list\n>not a quote',
+    'Some ***bold italic*** text',
+]
+
+# Samples the chained passes rendered as mis-nested tags, with the output
+# expected from the new renderer instead
+EXPECTED_DIFFERENCES = {
+    'Some ***bold italic*** text': 'Some <strong><em>bold italic</em></strong> text',
+}
+
+# Unclosed constructs repeated over a whole line: the old .*? patterns rescanned
+# the rest of the line from every opener, so rendering grew quadratically or worse
+PATHOLOGICAL_UNITS = ['![a](', '[a', '[a](http://', '[![a](b)', '[embed](http://', '**a', '*a', '~~a', '***a', '`a']
+PATHOLOGICAL_SIZE = 100 * 1024
+PATHOLOGICAL_LIMIT_MS = 500
+
+
+PROSE = ('The quick brown fox jumps over the lazy dog while the team reviews '
+         'the weekly metrics and plans the next sprint. ')
+
+
+def make_document(size):
+    """Build a post body of `size` bytes: mostly prose with every construct sprinkled in"""
+    paragraph = ''.join(PROSE * 3 + sample + '\n\n' for sample in PARITY_SAMPLES
+                        if '<' not in sample and sample not in EXPECTED_DIFFERENCES)
+    repeats = size // len(paragraph) + 1
+    return (paragraph * repeats)[:size]
+
+
+def check_parity():
+    mismatches = 0
+    samples = PARITY_SAMPLES + [make_document(16 * 1024)]
+    for sample in samples:
+        expected = EXPECTED_DIFFERENCES.get(sample) or legacy_parse_content_for_display(sample)
+        actual = render_markdown(sample)
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH for {sample[:60]!r}")
+            print(f"  legacy: {expected[:200]!r}")
+            print(f"  new:    {actual[:200]!r}")
+    print(f"Parity: {len(samples) - mismatches}/{len(samples)} samples identical")
+    return mismatches == 0
+
+
+def run_benchmark():
+    print(f"{'input':>8} {'legacy (ms)':>12} {'new (ms)':>10} {'speedup':>8}")
+    for label, size in [('1 KB', 1024), ('100 KB', 100 * 1024), ('5 MB', 5 * 1024 * 1024)]:
+        document = make_document(size)
+        number = max(1, (1024 * 1024) // size)
+        legacy = min(timeit.repeat(lambda: legacy_parse_content_for_display(document), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: render_markdown(document), number=number, repeat=3)) / number
+        print(f"{label:>8} {legacy * 1000:>12.2f} {new * 1000:>10.2f} {legacy / new:>7.2f}x")
+
+
+def check_pathological():
+    """Only the new renderer is timed: the old one does not finish on most of these"""
+    ok = True
+    for unit in PATHOLOGICAL_UNITS:
+        document = (unit * (PATHOLOGICAL_SIZE // len(unit) + 1))[:PATHOLOGICAL_SIZE]
+        started = time.perf_counter()
+        render_markdown(document)
+        elapsed = (time.perf_counter() - started) * 1000
+        within = elapsed <= PATHOLOGICAL_LIMIT_MS
+        ok = ok and within
+        print(f"{unit!r:>20} x {PATHOLOGICAL_SIZE // 1024} KB {elapsed:>9.2f} ms {'OK' if within else f'over {PATHOLOGICAL_LIMIT_MS} ms'}")
+    return ok
+
+
+if __name__ == '__main__':
+    ok = check_parity()
+    run_benchmark()
+    ok = check_pathological() and ok
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Measure search_posts() latency on a synthetic corpus.
+
+Fills a scratch database with generated posts (100k by default), builds the
+indexes the app declares, then times searches for rare, medium and common
+words and for two-word queries, and reports p50/p95/p99 per kind. Needs a
+running MongoDB; the scratch database is dropped afterwards unless --keep.
+
+    MONGO_URI=mongodb://localhost:27017 python3 benchmark_search.py --posts 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/duffins_blog')
+os.environ.setdefault('ENSURE_INDEXES_ON_STARTUP', 'False')
+os.environ.setdefault('JOB_WORKERS', '0')
+
+import app
+
+BENCHMARK_DB = 'duffins_blog_search_benchmark'
+TARGET_P95_MS = 50
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tu', 'vo', 'sha', 'bel', 'dri', 'fen', 'gor', 'hal', 'jin', 'nor', 'pex', 'qui', 'sol', 'tar', 'ul', 'zen']
+
+
+def make_vocabulary(size, rng):
+    """size distinct made-up words, so no stop word or stemming rule skews the results"""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def make_posts(count, vocabulary, rng, words_per_post=300):
+    """Posts whose words follow a Zipf distribution, like natural language: a few words are everywhere"""
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(vocabulary) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for n in range(count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=words_per_post)
+        title = ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=5)).capitalize()
+        paragraphs = [' '.join(words[i:i + 60]) for i in range(0, len(words), 60)]
+        content = '\n\n'.join(paragraphs)
+        timestamp = start + timedelta(minutes=n)
+        post = {
+            'title': title,
+            'slug': f"post-{n}",
+            'content': content,
+            'tags': rng.sample(vocabulary[:200], 2),
+            'author_username': 'benchmark',
+            'timestamp': timestamp,
+            'last_updated': timestamp
+        }
+        post.update(app.render_post_fields(content))
+        yield post
+
+
+def fill(collection, count, vocabulary, rng, batch_size=2000):
+    batch = []
+    for post in make_posts(count, vocabulary, rng):
+        batch.append(post)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    collection.create_indexes(app.INDEX_SPECS['posts'])
+
+
+def make_queries(vocabulary, rng, per_kind):
+    return {
+        'common word': [rng.choice(vocabulary[:20]) for _ in range(per_kind)],
+        'medium word': [rng.choice(vocabulary[200:2000]) for _ in range(per_kind)],
+        'rare word': [rng.choice(vocabulary[10000:]) for _ in range(per_kind)],
+        'two words': [f"{rng.choice(vocabulary[:2000])} {rng.choice(vocabulary[:2000])}" for _ in range(per_kind)],
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_benchmark(queries):
+    print(f"{'query':>12} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'results':>8}")
+    worst_p95 = 0
+    for kind, terms in queries.items():
+        timings, found = [], []
+        for query in terms:
+            started = time.perf_counter()
+            posts, _ = app.search_posts(query, 1, app.DEFAULT_PAGE_SIZE, app.INDEX_FIELDS + ['parsed_content'])
+            highlights = [app.highlight_post(post, app.search_terms(query)) for post in posts]
+            timings.append((time.perf_counter() - started) * 1000)
+            found.append(len(highlights))
+        p95 = percentile(timings, 0.95)
+        worst_p95 = max(worst_p95, p95)
+        print(f"{kind:>12} {statistics.median(timings):>9.2f} {p95:>9.2f} {percentile(timings, 0.99):>9.2f} {statistics.mean(found):>8.1f}")
+    return worst_p95
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200, help='searches per query kind')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database for another run')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    database = app.client[BENCHMARK_DB]
+    # search_posts() reads the module-level collection
+    app.posts_collection = database['posts']
+    try:
+        if app.posts_collection.estimated_document_count() != args.posts:
+            app.posts_collection.drop()
+            started = time.perf_counter()
+            fill(app.posts_collection, args.posts, vocabulary, rng)
+            print(f"Generated {args.posts} posts in {time.perf_counter() - started:.1f}s")
+        worst_p95 = run_benchmark(make_queries(vocabulary, rng, args.queries))
+        print(f"Worst p95: {worst_p95:.2f} ms (target {TARGET_P95_MS} ms)")
+    finally:
+        if not args.keep:
+            app.client.drop_database(BENCHMARK_DB)
+    sys.exit(0 if worst_p95 <= TARGET_P95_MS else 1)
@@ -13,7 +13,10 @@ interface BlogApiService {
     suspend fun login(@Body request: LoginRequest): Response<AuthResponse>
     
     @GET("posts")
-    suspend fun getPosts(): Response<BlogPostsResponse>
+    suspend fun getPosts(
+        @Query("cursor") cursor: String? = null,
+        @Query("limit") limit: Int = 100
+    ): Response<BlogPostsResponse>
     
     @GET("posts/{id}")
     suspend fun getPost(@Path("id") id: String): Response<BlogPost>
@@ -71,7 +71,9 @@ data class CreatePostRequest(
 
 data class BlogPostsResponse(
     @SerializedName("posts")
-    val posts: List<BlogPost>
+    val posts: List<BlogPost>,
+    @SerializedName("next_cursor")
+    val nextCursor: String? = null
 )
 
 data class ApiResponse<T>(
@@ -85,5 +87,7 @@ data class ApiResponse<T>(
 
 data class AISummaryResponse(
     @SerializedName("summary")
-    val summary: String
+    val summary: String? = null,
+    @SerializedName("status")
+    val status: String? = null
 )
@@ -1,5 +1,6 @@
 package xyz.yeems214.DuffinsBlog.data.repository
 
+import kotlinx.coroutines.delay
 import kotlinx.coroutines.withTimeoutOrNull
 import xyz.yeems214.DuffinsBlog.data.api.BlogApiService
 import xyz.yeems214.DuffinsBlog.data.model.*
@@ -8,14 +9,22 @@ class BlogRepository(private val apiService: BlogApiService) {
     
     suspend fun getPosts(): Result<List<BlogPost>> {
         return try {
-            val response = withTimeoutOrNull(30000L) { // 30 second timeout
-                apiService.getPosts()
-            }
-            if (response?.isSuccessful == true) {
-                Result.success(response.body()?.posts ?: emptyList())
-            } else {
-                Result.failure(Exception("Failed to fetch posts: ${response?.message() ?: "Timeout"}"))
+            // The API returns posts a page at a time; follow next_cursor until the last page
+            val posts = withTimeoutOrNull(30000L) { // 30 second timeout
+                val allPosts = mutableListOf<BlogPost>()
+                var cursor: String? = null
+                do {
+                    val response = apiService.getPosts(cursor)
+                    if (!response.isSuccessful) {
+                        throw Exception("Failed to fetch posts: ${response.message()}")
+                    }
+                    val page = response.body()
+                    allPosts.addAll(page?.posts ?: emptyList())
+                    cursor = page?.nextCursor
+                } while (cursor != null)
+                allPosts
             }
+            posts?.let { Result.success(it) } ?: Result.failure(Exception("Failed to fetch posts: Timeout"))
         } catch (e: Exception) {
             Result.failure(e)
         }
@@ -125,16 +134,22 @@ class BlogRepository(private val apiService: BlogApiService) {
         }
     }    suspend fun generateAISummary(postSlug: String): Result<String> {
         return try {
-            val response = withTimeoutOrNull(60000L) { // 60 second timeout for AI generation
-                apiService.generateAISummary(postSlug)
-            }
-            if (response?.isSuccessful == true) {
-                response.body()?.let { summaryResponse ->
-                    Result.success(summaryResponse.summary)
-                } ?: Result.failure(Exception("Failed to generate AI summary"))
-            } else {
-                Result.failure(Exception("Failed to generate AI summary: ${response?.message() ?: "Timeout"}"))
+            // The server answers 202 {"status": "pending"} while it generates the summary, so poll until it is ready
+            val summary = withTimeoutOrNull(60000L) { // 60 second timeout for AI generation
+                var result: String? = null
+                while (result == null) {
+                    val response = apiService.generateAISummary(postSlug)
+                    if (!response.isSuccessful) {
+                        throw Exception("Failed to generate AI summary: ${response.message()}")
+                    }
+                    result = response.body()?.summary
+                    if (result == null) {
+                        delay(2000L)
+                    }
+                }
+                result
             }
+            summary?.let { Result.success(it) } ?: Result.failure(Exception("Failed to generate AI summary: Timeout"))
         } catch (e: Exception) {
             Result.failure(e)
         }
@@ -183,6 +183,12 @@ struct BlogPost: Codable, Identifiable {
 
 struct BlogPostsResponse: Codable {
     let posts: [BlogPost]
+    let nextCursor: String?
+    
+    enum CodingKeys: String, CodingKey {
+        case posts
+        case nextCursor = "next_cursor"
+    }
 }
 
 struct BlogPostResponse: Codable {
@@ -205,7 +211,8 @@ struct CreatePostRequest: Codable {
 
 // MARK: - AI Summary Models
 struct AISummaryResponse: Codable {
-    let summary: String
+    let summary: String?
+    let status: String?
 }
 
 struct AISummaryErrorResponse: Codable {
@@ -97,14 +97,25 @@ class BlogService: ObservableObject {
     func fetchPosts() async throws {
         await MainActor.run { isLoading = true }
         
-        let response: BlogPostsResponse = try await performRequest(
-            endpoint: "/posts",
-            method: "GET",
-            requiresAuth: false
-        )
+        // The API returns posts a page at a time; follow next_cursor until the last page
+        var allPosts: [BlogPost] = []
+        var cursor: String? = nil
+        repeat {
+            var endpoint = "/posts?limit=100"
+            if let cursor = cursor {
+                endpoint += "&cursor=\(cursor)"
+            }
+            let response: BlogPostsResponse = try await performRequest(
+                endpoint: endpoint,
+                method: "GET",
+                requiresAuth: false
+            )
+            allPosts.append(contentsOf: response.posts)
+            cursor = response.nextCursor
+        } while cursor != nil
         
         await MainActor.run {
-            self.posts = response.posts
+            self.posts = allPosts
             self.isLoading = false
         }
     }
@@ -159,12 +170,19 @@ class BlogService: ObservableObject {
     // MARK: - AI Summary Methods
     
     func generateAISummary(for slug: String) async throws -> String {
-        let response: AISummaryResponse = try await performRequest(
-            endpoint: "/generate-summary/\(slug)",
-            method: "GET",
-            requiresAuth: false
-        )
-        return response.summary
+        // The server answers 202 {"status": "pending"} while it generates the summary, so poll until it is ready
+        for _ in 0..<30 {
+            let response: AISummaryResponse = try await performRequest(
+                endpoint: "/generate-summary/\(slug)",
+                method: "GET",
+                requiresAuth: false
+            )
+            if let summary = response.summary {
+                return summary
+            }
+            try await Task.sleep(nanoseconds: 2_000_000_000)
+        }
+        throw APIError.serverError("The summary is taking longer than expected. Please try again.")
     }
     
     // MARK: - Generic Request Handler
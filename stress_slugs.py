@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Check that parallel creates of posts with the same title get distinct slugs.
+
+Starts --workers threads that create posts titled alike at the same moment,
+through allocate_slug() and insert_post() as the create endpoints do, and
+fails if two posts share a slug. It runs once on a fresh title and once on a
+title whose slugs were taken before slug counters existed (`title`,
+`title-1`, `title-3`), which must not be handed out again. Needs a running
+MongoDB; the scratch database is dropped afterwards.
+
+    MONGO_URI=mongodb://localhost:27017 python3 stress_slugs.py --workers 50
+"""
+
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/duffins_blog')
+os.environ.setdefault('ENSURE_INDEXES_ON_STARTUP', 'False')
+os.environ.setdefault('JOB_WORKERS', '0')
+
+import app
+
+STRESS_DB = 'duffins_blog_slug_stress'
+LEGACY_SUFFIXES = ['', '-1', '-3']
+
+
+def create_post(title, start):
+    """What the create endpoints do to store a post, once every create is queued"""
+    start.wait()
+    now = datetime.now(timezone.utc)
+    post = {'title': title, 'slug': app.allocate_slug(title), 'content': '', 'tags': [], 'timestamp': now, 'last_updated': now}
+    app.insert_post(post)
+    return post['slug']
+
+
+def run_scenario(label, title, workers, creates, taken=()):
+    start = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(create_post, title, start) for _ in range(creates)]
+        start.set()
+        slugs = [future.result() for future in futures]
+    duplicates = sorted(slug for slug, count in Counter(slugs).items() if count > 1)
+    reused = sorted(set(slugs) & set(taken))
+    ok = not duplicates and not reused
+    print(f"{label}: {creates} creates, {len(set(slugs))} distinct slugs, "
+          f"{len(duplicates)} duplicated, {len(reused)} legacy slugs reused -> {'OK' if ok else 'FAIL'}")
+    for slug in duplicates + reused:
+        print(f"  {slug}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=50, help='threads creating posts at once')
+    parser.add_argument('--creates', type=int, default=200, help='posts created per scenario')
+    args = parser.parse_args()
+
+    database = app.client[STRESS_DB]
+    # allocate_slug() and insert_post() read the module-level collections
+    app.posts_collection = database['posts']
+    app.slug_counters_collection = database['slug_counters']
+    try:
+        app.client.drop_database(STRESS_DB)
+        app.posts_collection.create_indexes(app.INDEX_SPECS['posts'])
+
+        ok = run_scenario('fresh title', 'Same Title', args.workers, args.creates)
+
+        base = app.slugify('Legacy Title')
+        taken = [base + suffix for suffix in LEGACY_SUFFIXES]
+        now = datetime.now(timezone.utc)
+        app.posts_collection.insert_many([
+            {'title': 'Legacy Title', 'slug': slug, 'content': '', 'tags': [], 'timestamp': now, 'last_updated': now}
+            for slug in taken
+        ])
+        ok = run_scenario('legacy slugs', 'Legacy Title', args.workers, args.creates, taken) and ok
+    finally:
+        app.client.drop_database(STRESS_DB)
+    sys.exit(0 if ok else 1)